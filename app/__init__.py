@@ -2,17 +2,17 @@
 
 # third-party imports
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_bootstrap import Bootstrap
 
 # local imports)
 from config import app_config
+from app.tenants import TenantSQLAlchemy
 
 
 # db variable initialization
-db = SQLAlchemy()
+db = TenantSQLAlchemy()
 
 login_manager = LoginManager()
 
@@ -29,12 +29,40 @@ def create_app(config_name):
     login_manager.login_view = "auth.login"
     migrate = Migrate(app, db)
 
+    from app import tenants
+    tenants.init_app(app)
+
+    from app import assets
+    assets.init_app(app)
+
     from app import models
 
+    from app import sessions
+    sessions.init_app(app)
+
     from .auth import auth as auth_blueprint
     app.register_blueprint(auth_blueprint)
 
     from .home import home as home_blueprint
     app.register_blueprint(home_blueprint)
 
+    from .admin import admin as admin_blueprint
+    app.register_blueprint(admin_blueprint)
+
+    from .health import health as health_blueprint
+    app.register_blueprint(health_blueprint)
+
+    from app.stats import InFlight
+    app.wsgi_app = InFlight(app.wsgi_app)
+    app.extensions['in_flight'] = app.wsgi_app
+
+    from app import profiling
+    profiling.init_app(app)
+
+    from app import slow_queries
+    slow_queries.init_app(app)
+
+    from .commands import register_commands
+    register_commands(app)
+
     return app
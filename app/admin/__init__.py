@@ -0,0 +1,7 @@
+# app/admin/__init__.py
+
+from flask import Blueprint
+
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+from . import views
\ No newline at end of file
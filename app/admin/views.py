@@ -0,0 +1,136 @@
+# app/admin/views.py
+
+import math
+import os
+from datetime import datetime
+
+from flask import abort, current_app, jsonify, render_template, request, send_from_directory
+from flask_login import login_required, current_user
+
+from . import admin
+from .. import bulk, db, profiling, slow_queries
+
+
+@admin.route('/profiles')
+@login_required
+def list_profiles():
+    """
+    Render the admin template on the /admin/profiles route
+    """
+    if not current_user.is_admin:
+        abort(403)
+    return render_template('admin/profiles/list.html', profiles=profiling.list_profiles(),
+                           enabled=current_app.config['PROFILE_ENABLED'], title="Profiles")
+
+
+@admin.route('/profiles/<name>')
+@login_required
+def download_profile(name):
+    """
+    Download a stored profile
+    """
+    if not current_user.is_admin:
+        abort(403)
+    return send_from_directory(os.path.join(current_app.instance_path,
+                                            current_app.config['PROFILE_DIR']),
+                               name, as_attachment=True)
+
+
+@admin.route('/slow-queries')
+@login_required
+def list_slow_queries():
+    """
+    Render the admin template on the /admin/slow-queries route
+    """
+    if not current_user.is_admin:
+        abort(403)
+    threshold = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+    queries = slow_queries.recent(current_app) if threshold is not None else []
+    return render_template('admin/slow_queries/list.html', queries=queries, threshold=threshold,
+                           title="Slow Queries")
+
+
+def _run_bulk(operation):
+    """
+    Run a bulk operation on the JSON body of the request, in one transaction
+
+    The operation is given the body and returns the affected counts. With
+    dry_run set the counts are returned and the transaction rolled back.
+    """
+    if not current_user.is_admin:
+        abort(403)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error='A JSON object is required.'), 400
+    try:
+        counts = operation(payload)
+    except KeyError as exception:
+        db.session.rollback()
+        return jsonify(error='{} is required.'.format(exception.args[0])), 400
+    except (bulk.BulkError, TypeError, ValueError) as exception:
+        db.session.rollback()
+        return jsonify(error=str(exception) or 'Invalid request.'), 400
+    if payload.get('dry_run'):
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return jsonify(counts=counts, dry_run=bool(payload.get('dry_run')))
+
+
+def _selection(payload):
+    """
+    Select the products named by the ids and filter of a request body
+    """
+    return bulk.products(payload.get('ids'), payload.get('filter'))
+
+
+@admin.route('/bulk/products/delete', methods=['POST'])
+@login_required
+def bulk_delete_products():
+    """
+    Delete products with their shipments, transactions and derived rows
+    """
+    return _run_bulk(lambda payload: bulk.delete_products(_selection(payload)))
+
+
+@admin.route('/bulk/products/relocate', methods=['POST'])
+@login_required
+def bulk_relocate_products():
+    """
+    Move products to the location given as text
+    """
+    return _run_bulk(lambda payload: bulk.relocate(_selection(payload), payload['location']))
+
+
+@admin.route('/bulk/products/supplier', methods=['POST'])
+@login_required
+def bulk_change_supplier():
+    """
+    Give products another supplier, null for none
+    """
+    return _run_bulk(lambda payload: bulk.change_supplier(_selection(payload), payload['supplier_id']))
+
+
+@admin.route('/bulk/products/adjust', methods=['POST'])
+@login_required
+def bulk_adjust_stock():
+    """
+    Add a quantity to the stock of products, negative to take it off
+    """
+    def adjust(payload):
+        entry_date = datetime.strptime(payload['date'], '%Y-%m-%d').date() if payload.get('date') \
+            else None
+        quantity = float(payload['quantity'])
+        if not math.isfinite(quantity):
+            raise bulk.BulkError('quantity must be a finite number.')
+        return bulk.adjust_stock(_selection(payload), quantity, entry_date)
+    return _run_bulk(adjust)
+
+
+@admin.route('/bulk/suppliers/delete', methods=['POST'])
+@login_required
+def bulk_delete_suppliers():
+    """
+    Delete suppliers, their products are kept without one
+    """
+    return _run_bulk(lambda payload: bulk.delete_suppliers(payload['ids']))
@@ -0,0 +1,144 @@
+# app/archive.py
+
+import os
+from datetime import timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import and_, func, select
+
+from app import db, ledger, sync, tenants
+from app.models import StockSnapshot, Transaction
+
+
+COLUMNS = ('id', 'product_id', 'date', 'quantity', 'reason')
+
+
+def _directory():
+    # each tenant archives to its own subdirectory
+    tenant = tenants.current()
+    directory = os.path.join(current_app.instance_path, current_app.config['ARCHIVE_DIR'])
+    return os.path.join(directory, tenant) if tenant is not None else directory
+
+
+def _partition_path(month):
+    return os.path.join(_directory(), 'transactions-{:%Y-%m}.npz'.format(month))
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _months(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = _next_month(month)
+
+
+def _load(path):
+    with np.load(path) as partition:
+        return {column: partition[column] for column in COLUMNS}
+
+
+def _write_partition(month, rows):
+    """
+    Write the rows of a month to its partition, merging with what is there
+
+    The file is written next to the partition and renamed over it, so a
+    partition is never left half written. Rows already in the partition,
+    from a run whose commit failed, are only kept once.
+    """
+    columns = {
+        'id': np.array([row.id for row in rows], dtype=np.int64),
+        'product_id': np.array([-1 if row.product_id is None else row.product_id
+                                for row in rows], dtype=np.int64),
+        'date': np.array([row.date for row in rows], dtype='datetime64[D]'),
+        'quantity': np.array([row.quantity or 0 for row in rows], dtype=np.float64),
+        'reason': np.array([row.reason or '' for row in rows], dtype='<U20'),
+    }
+    path = _partition_path(month)
+    if os.path.exists(path):
+        existing = _load(path)
+        columns = {column: np.concatenate([existing[column], columns[column]])
+                   for column in COLUMNS}
+        _, unique = np.unique(columns['id'], return_index=True)
+        columns = {column: values[unique] for column, values in columns.items()}
+    order = np.argsort(columns['date'], kind='stable')
+    columns = {column: values[order] for column, values in columns.items()}
+    temporary = path + '.tmp.npz'
+    np.savez_compressed(temporary, **columns)
+    os.replace(temporary, path)
+
+
+def archive_transactions(cutoff):
+    """
+    Move the transactions dated before cutoff to monthly partitions
+
+    cutoff has to be the first day of a month. The archived rows, and any
+    earlier opening balances, are replaced by one opening balance per
+    product dated the day before cutoff, so stock sums and the ledger still
+    agree. The stock snapshots before cutoff are replaced by one on that
+    day, stock is not read before it anymore. Returns the number of
+    transactions archived.
+    """
+    os.makedirs(_directory(), exist_ok=True)
+    table = Transaction.__table__
+    first = db.session.query(func.min(Transaction.date)) \
+        .filter(Transaction.date < cutoff, ledger.is_movement(Transaction.reason)).scalar()
+    if first is None:
+        return 0
+
+    count = 0
+    for month in _months(first, cutoff - timedelta(days=1)):
+        rows = db.session.execute(
+            select([table.c[column] for column in COLUMNS])
+            .where(and_(table.c.date >= month,
+                        table.c.date < _next_month(month),
+                        ledger.is_movement(table.c.reason)))).fetchall()
+        if rows:
+            _write_partition(month, rows)
+            count += len(rows)
+
+    balances = db.session.query(Transaction.product_id, func.sum(Transaction.quantity)) \
+        .filter(Transaction.date < cutoff) \
+        .group_by(Transaction.product_id).all()
+    sync.touch(Transaction, Transaction.date < cutoff, deleted=True)
+    Transaction.query.filter(Transaction.date < cutoff).delete(synchronize_session=False)
+    inserted_after = sync.last_id(Transaction)
+    db.session.bulk_insert_mappings(Transaction, [
+        {'product_id': product_id, 'date': cutoff - timedelta(days=1),
+         'quantity': quantity, 'reason': ledger.OPENING_BALANCE}
+        for product_id, quantity in balances if product_id is not None
+    ])
+    sync.touch(Transaction, Transaction.id > inserted_after)
+    # earlier snapshots would count the opening balances on top of
+    # themselves, see ledger.stock_as_of
+    StockSnapshot.query.filter(StockSnapshot.date < cutoff).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(StockSnapshot, [
+        {'product_id': product_id, 'date': cutoff - timedelta(days=1), 'stock': quantity}
+        for product_id, quantity in balances if product_id is not None
+    ])
+    db.session.commit()
+    return count
+
+
+def read_transactions(from_date, to_date):
+    """
+    Read the archived transactions dated between two days
+
+    Only the partitions of the months overlapping the range are opened.
+    Returns a dictionary of column arrays.
+    """
+    parts = []
+    for month in _months(from_date, to_date):
+        path = _partition_path(month)
+        if not os.path.exists(path):
+            continue
+        partition = _load(path)
+        dates = partition['date']
+        mask = (dates >= np.datetime64(from_date)) & (dates <= np.datetime64(to_date))
+        parts.append({column: values[mask] for column, values in partition.items()})
+    if not parts:
+        return {column: np.zeros(0) for column in COLUMNS}
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
@@ -0,0 +1,222 @@
+# app/assets.py
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bundles built from the stylesheets and scripts the layouts link, in order
+BUNDLES = {
+    'base.css': [
+        'bower_components/bootstrap/dist/css/bootstrap.min.css',
+        'bower_components/font-awesome/css/font-awesome.min.css',
+        'bower_components/Ionicons/css/ionicons.min.css',
+        'bower_components/datatables.net-bs/css/dataTables.bootstrap.min.css',
+        'dist/css/AdminLTE.min.css',
+        'dist/css/skins/_all-skins.min.css',
+        'dist/css/Style.css',
+    ],
+    'base.js': [
+        'bower_components/jquery/dist/jquery.min.js',
+        'bower_components/bootstrap/dist/js/bootstrap.min.js',
+        'bower_components/datatables.net/js/jquery.dataTables.min.js',
+        'bower_components/datatables.net-bs/js/dataTables.bootstrap.min.js',
+        'bower_components/jquery-slimscroll/jquery.slimscroll.min.js',
+        'bower_components/fastclick/lib/fastclick.js',
+        'dist/js/adminlte.min.js',
+        'dist/js/demo.js',
+    ],
+    'auth.css': [
+        'bower_components/bootstrap/dist/css/bootstrap.min.css',
+        'bower_components/font-awesome/css/font-awesome.min.css',
+        'bower_components/Ionicons/css/ionicons.min.css',
+        'dist/css/AdminLTE.min.css',
+        'plugins/iCheck/square/blue.css',
+        'dist/css/Style.css',
+    ],
+    'auth.js': [
+        'bower_components/jquery/dist/jquery.min.js',
+        'bower_components/bootstrap/dist/js/bootstrap.min.js',
+        'plugins/iCheck/icheck.min.js',
+    ],
+}
+
+# Directory of the built assets and their manifest, inside the static folder
+OUTPUT_DIR = 'gen'
+MANIFEST = OUTPUT_DIR + '/manifest.json'
+
+# Built assets never change under the same name
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.eot', '.ttf')
+
+STATIC_REFERENCE = re.compile(r"url_for\('static',\s*filename='([^']+)'\)")
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT = re.compile(r'/\*(?!!)[\s\S]*?\*/')
+
+
+def _rewrite_css_urls(css, source, target):
+    """
+    Point the relative urls of a stylesheet moved from source to target
+    back at the files they referenced
+    """
+    def rewrite(match):
+        quote, url = match.groups()
+        if re.match(r'^(data:|[a-z]+:|/|#)', url):
+            return match.group(0)
+        path, _, rest = url.partition('?')
+        path, _, fragment = path.partition('#')
+        resolved = os.path.normpath(os.path.join(os.path.dirname(source), path))
+        relative = os.path.relpath(resolved, os.path.dirname(target)).replace(os.sep, '/')
+        if rest:
+            relative += '?' + rest
+        if fragment:
+            relative += '#' + fragment
+        return 'url({0}{1}{0})'.format(quote, relative)
+    return CSS_URL.sub(rewrite, css)
+
+
+def _minify_css(css):
+    css = CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};])\s*', r'\1', css).strip()
+
+
+def _fingerprint(name, content):
+    root, extension = os.path.splitext(name)
+    return '{}.{}{}'.format(root, hashlib.sha256(content).hexdigest()[:12], extension)
+
+
+def _write(static_folder, name, content):
+    path = os.path.join(static_folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as output:
+        output.write(content)
+    if name.endswith(COMPRESSIBLE):
+        compressed = gzip.compress(content, 9)
+        if len(compressed) < len(content):
+            with open(path + '.gz', 'wb') as output:
+                output.write(compressed)
+        if brotli is not None:
+            compressed = brotli.compress(content)
+            if len(compressed) < len(content):
+                with open(path + '.br', 'wb') as output:
+                    output.write(compressed)
+
+
+def _read(static_folder, name):
+    with open(os.path.join(static_folder, name), 'rb') as source:
+        return source.read()
+
+
+def _referenced_files(template_folder):
+    """
+    Find the static files the templates link with a literal filename
+    """
+    names = set()
+    for directory, _, files in os.walk(template_folder):
+        for file_name in files:
+            with open(os.path.join(directory, file_name), encoding='utf-8') as template:
+                names.update(STATIC_REFERENCE.findall(template.read()))
+    return sorted(names)
+
+
+def build(app):
+    """
+    Build the bundles and fingerprinted copies of the referenced files
+
+    Every output is named after the hash of its content, compressed next
+    to itself and listed in the manifest that url_for resolves names with.
+    Returns the manifest.
+    """
+    static_folder = app.static_folder
+    shutil.rmtree(os.path.join(static_folder, OUTPUT_DIR), ignore_errors=True)
+    manifest = {}
+
+    for bundle, sources in BUNDLES.items():
+        name = OUTPUT_DIR + '/' + bundle
+        if bundle.endswith('.css'):
+            content = '\n'.join(
+                _minify_css(_rewrite_css_urls(_read(static_folder, source).decode('utf-8'),
+                                              source, name))
+                for source in sources).encode('utf-8')
+        else:
+            content = b'\n;'.join(_read(static_folder, source) for source in sources)
+        manifest[name] = _fingerprint(name, content)
+        _write(static_folder, manifest[name], content)
+
+    for source in _referenced_files(os.path.join(app.root_path, app.template_folder)):
+        if not os.path.isfile(os.path.join(static_folder, source)):
+            continue
+        name = OUTPUT_DIR + '/' + source
+        content = _read(static_folder, source)
+        if source.endswith('.css'):
+            content = _rewrite_css_urls(content.decode('utf-8'), source, name).encode('utf-8')
+        manifest[source] = _fingerprint(name, content)
+        _write(static_folder, manifest[source], content)
+
+    with open(os.path.join(static_folder, MANIFEST), 'w') as output:
+        json.dump(manifest, output, indent=2, sort_keys=True)
+    return manifest
+
+
+def asset_urls(bundle):
+    """
+    Return the urls to link for a bundle
+
+    Once built that is the bundle itself, otherwise each of its sources.
+    """
+    if OUTPUT_DIR + '/' + bundle in current_app.extensions['assets']:
+        return [url_for('static', filename=OUTPUT_DIR + '/' + bundle)]
+    return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+
+def _resolve(endpoint, values):
+    if endpoint == 'static':
+        manifest = current_app.extensions['assets']
+        values['filename'] = manifest.get(values.get('filename'), values.get('filename'))
+
+
+def send_static(filename):
+    """
+    Serve a static file, built assets precompressed and cached for good
+    """
+    if not filename.startswith(OUTPUT_DIR + '/'):
+        return current_app.send_static_file(filename)
+    response = None
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and \
+                os.path.isfile(os.path.join(current_app.static_folder, filename + suffix)):
+            response = send_from_directory(current_app.static_folder, filename + suffix,
+                                           mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = current_app.send_static_file(filename)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    path = os.path.join(app.static_folder, MANIFEST)
+    manifest = {}
+    if os.path.isfile(path):
+        with open(path) as source:
+            manifest = json.load(source)
+    app.extensions['assets'] = manifest
+    app.add_template_global(asset_urls)
+    app.url_defaults(_resolve)
+    app.view_functions['static'] = send_static
@@ -1,11 +1,12 @@
 # app/auth/views.py
 
-from flask import abort, flash, redirect, render_template, url_for
+from flask import abort, current_app, flash, redirect, render_template, session, url_for
 from flask_login import login_required, login_user, logout_user, current_user
 
 from . import auth
 from .forms import LoginForm, RegistrationForm
-from .. import db
+from .. import db, tenants
+from ..passwords import HashingBusy
 from ..models import Employee
 
 
@@ -20,11 +21,15 @@ def register():
         abort(403)
     form = RegistrationForm()
     if form.validate_on_submit():
-        employee = Employee(email=form.email.data,
-                            username=form.username.data,
-                            name=form.name.data,
-                            role=form.role.data,
-                            password=form.password.data)
+        try:
+            employee = Employee(email=form.email.data,
+                                username=form.username.data,
+                                name=form.name.data,
+                                role=form.role.data,
+                                password=form.password.data)
+        except HashingBusy:
+            flash('The server is busy, please try again in a moment.')
+            return render_template('auth/register.html', form=form, title='Register'), 503
 
         # add employee to the database
         db.session.add(employee)
@@ -45,7 +50,10 @@ def login():
     Log an employee in through the login form
     """
 
-    if Employee.query.count() == 0:
+    form = LoginForm()
+    # plants get their first admin from `flask tenants add-admin`, not a
+    # known password any visitor could use
+    if not current_app.config['TENANTS'] and Employee.query.count() == 0:
         employee = Employee(email='admin@polito.it',
                             username='admin_user',
                             name='Admin User',
@@ -56,19 +64,29 @@ def login():
         db.session.add(employee)
         db.session.commit()
 
-    form = LoginForm()
     if form.validate_on_submit():
+        # the plant of the employee, unless the subdomain names one
+        routed = tenants.login(form.email.data)
 
         # check whether employee exists in the database and whether
         # the password entered matches the password in the database
         employee = Employee.query.filter_by(email=form.email.data).first()
-        if employee is not None and employee.verify_password(
-                form.password.data):
+        try:
+            verified = employee is not None and employee.verify_password(form.password.data)
+        except HashingBusy:
+            flash('Too many logins at once, please try again in a moment.')
+            return render_template('auth/login.html', form=form, title='Login'), 503
+        if verified:
+            # save the password hash if it was upgraded
+            db.session.commit()
+
             # log employee in
             login_user(employee)
+            session['tenant'] = tenants.current()
+            tenants.remember(routed)
 
             # redirect to the dashboard page after login
-            return redirect(url_for('home.list_products'))
+            return redirect(url_for('home.show_dashboard'))
 
         # when login details are incorrect
         else:
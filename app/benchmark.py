@@ -0,0 +1,155 @@
+# app/benchmark.py
+
+import time
+import tracemalloc
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+
+from flask import current_app
+
+from app import db, ledger, listings, passwords, scans, sync
+from app.models import Product, Shipment, StockSnapshot, Supplier, Transaction
+
+
+def _read(query, columns):
+    values = attrgetter(*columns)
+    count = 0
+    for row in query:
+        values(row)
+        count += 1
+    return count
+
+
+def _run(build, columns):
+    """
+    Read every row of a fresh query, return its seconds, peak bytes and rows
+    """
+    db.session.expunge_all()
+    start = time.perf_counter()
+    count = _read(build(), columns)
+    seconds = time.perf_counter() - start
+    db.session.expunge_all()
+    tracemalloc.start()
+    try:
+        _read(build(), columns)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    db.session.expunge_all()
+    return seconds, peak, count
+
+
+PRODUCT_COLUMNS = ('id', 'name', 'location', 'stock', 'rcv_date', 'exp_date', 'abc_class',
+                   'xyz_class')
+SUPPLIER_COLUMNS = ('id', 'name', 'email', 'contact', 'address')
+SHIPMENT_COLUMNS = ('id', 'department', 'name', 'quantity', 'shipment_date')
+
+# listing -> (ORM query, its columns, projection, its columns)
+LISTINGS = {
+    'products': (lambda: Product.query, PRODUCT_COLUMNS,
+                 listings.product_rows, PRODUCT_COLUMNS),
+    'suppliers': (lambda: Supplier.query, SUPPLIER_COLUMNS,
+                  listings.supplier_rows, SUPPLIER_COLUMNS),
+    'shipments': (lambda: Shipment.query, SHIPMENT_COLUMNS + ('product',),
+                  listings.shipment_rows, SHIPMENT_COLUMNS + ('product_name',)),
+}
+
+
+def compare_listings(runs=3):
+    """
+    Time and measure the peak memory of reading each listing as ORM
+    instances and as a column projection
+
+    Yields the listing, the path, its row count, best seconds and peak bytes.
+    """
+    for name, (entities, entity_columns, projection, columns) in LISTINGS.items():
+        for path, build, columns in (('orm', entities, entity_columns),
+                                     ('projection', projection, columns)):
+            results = [_run(build, columns) for _ in range(runs)]
+            yield (name, path, results[0][2], min(result[0] for result in results),
+                   min(result[1] for result in results))
+
+
+def login_throughput(logins=200, concurrency=50):
+    """
+    Verify passwords from concurrent logins the way the login view does
+
+    Returns the logins verified per second, the median and 95th percentile
+    seconds a login took and the number turned away as busy.
+    """
+    app = current_app._get_current_object()
+    password_hash = passwords.hash_password('benchmark')
+
+    def login(_):
+        with app.app_context():
+            start = time.perf_counter()
+            try:
+                passwords.verify_password(password_hash, 'benchmark')
+            except passwords.HashingBusy:
+                return None
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as clients:
+        results = list(clients.map(login, range(logins)))
+    seconds = time.perf_counter() - start
+    latencies = sorted(result for result in results if result is not None)
+    if not latencies:
+        return 0.0, None, None, logins
+    return (len(latencies) / seconds, latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.95)], logins - len(latencies))
+
+
+def scan_throughput(events=2000, concurrency=50):
+    """
+    Book receipts from concurrent callers one commit each, the way the
+    product handlers do, and through the group committer
+
+    A throwaway product takes the receipts and is deleted with its ledger
+    afterwards. Returns the events per second and the failed events of
+    each path.
+    """
+    app = current_app._get_current_object()
+    product = Product(name='Scan benchmark', stock=0)
+    db.session.add(product)
+    db.session.commit()
+    product_id = product.id
+    today = date.today()
+
+    def single(_):
+        with app.app_context():
+            try:
+                ledger.record(Product.query.get(product_id), 1, today, ledger.RECEIPT)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                return False
+            finally:
+                db.session.remove()
+        return True
+
+    def grouped(_):
+        with app.app_context():
+            try:
+                future = scans.submit(product_id, 1, today, ledger.RECEIPT)
+                future.result(timeout=app.config['SCAN_ACK_TIMEOUT'])
+            except Exception:
+                return False
+        return True
+
+    results = []
+    try:
+        for book in (single, grouped):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as callers:
+                booked = list(callers.map(book, range(events)))
+            results.append((events / (time.perf_counter() - start), booked.count(False)))
+    finally:
+        sync.touch(Transaction, Transaction.product_id == product_id, deleted=True)
+        sync.touch(Product, Product.id == product_id, deleted=True)
+        Transaction.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+        StockSnapshot.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+        Product.query.filter_by(id=product_id).delete(synchronize_session=False)
+        db.session.commit()
+    return results
@@ -0,0 +1,204 @@
+# app/bulk.py
+
+from datetime import date
+
+from sqlalchemy import func, literal, select
+
+from app import dashboard, db, ledger, locations, sync
+from app.models import ConsumptionCell, Forecast, Location, Product, ReorderPoint, Shipment, \
+    StockSnapshot, Supplier, Transaction
+
+
+# Rows recorded against a product, deleted along with it
+DEPENDENTS = (
+    ('shipments', Shipment),
+    ('transactions', Transaction),
+    ('stock_snapshots', StockSnapshot),
+    ('forecasts', Forecast),
+    ('reorder_points', ReorderPoint),
+    ('consumption_cells', ConsumptionCell),
+)
+
+# Filters a selection of products takes, with the column each one matches
+FILTERS = {
+    'supplier_id': Product.supplier_id,
+    'location_id': Product.location_id,
+    'abc': Product.abc_class,
+    'xyz': Product.xyz_class,
+}
+
+
+class BulkError(Exception):
+    """
+    Raised for a bulk operation that cannot run, the caller rolls back
+    """
+
+
+def _ids(ids):
+    """
+    Check that ids are a list of integers, as decoded from JSON
+    """
+    if not isinstance(ids, list) or not all(isinstance(id, int) and not isinstance(id, bool)
+                                            for id in ids):
+        raise BulkError('ids must be a list of integers.')
+    return ids
+
+
+def products(ids=None, filters=None):
+    """
+    Select the ids of the products an operation runs on
+
+    Products are given as a list of ids, as filters, or both. At least one
+    is needed so that no operation runs on every product by mistake.
+    """
+    if ids is None and not filters:
+        raise BulkError('Pass ids or a filter.')
+    if filters is not None and not isinstance(filters, dict):
+        raise BulkError('filter must be an object.')
+    query = select([Product.id])
+    if ids is not None:
+        query = query.where(Product.id.in_(_ids(ids)))
+    for name, value in (filters or {}).items():
+        if name == 'name':
+            query = query.where(Product.name.ilike('%{}%'.format(value)))
+        elif name in FILTERS:
+            query = query.where(FILTERS[name] == value)
+        else:
+            raise BulkError('Unknown filter {}.'.format(name))
+    # the selection is nested in statements on products, it must not
+    # correlate to them
+    return query.correlate(None)
+
+
+def _table_update(model, selection):
+    # bumped so that forms opened before the operation are not saved over it
+    return model.__table__.update().where(model.id.in_(selection)).values(version=model.version + 1)
+
+
+def _take_location_stock(selection):
+    """
+    Take the stock of the selected products off their locations
+    """
+    taken = select([func.coalesce(func.sum(Product.stock), 0)]) \
+        .where(Product.location_id == Location.id) \
+        .where(Product.id.in_(selection)).as_scalar()
+    held = select([Product.location_id]).where(Product.id.in_(selection)).correlate(None)
+    db.session.execute(Location.__table__.update().where(Location.id.in_(held))
+                       .values(stock=Location.stock - taken))
+
+
+def delete_products(selection):
+    """
+    Delete products with every row recorded against them
+
+    Returns the number of rows deleted from each table, the caller commits.
+    """
+    _take_location_stock(selection)
+    sync.touch(Shipment, Shipment.product_id.in_(selection), deleted=True)
+    sync.touch(Transaction, Transaction.product_id.in_(selection), deleted=True)
+    sync.touch(Product, Product.id.in_(selection), deleted=True)
+    counts = {}
+    for name, model in DEPENDENTS:
+        counts[name] = db.session.execute(
+            model.__table__.delete().where(model.product_id.in_(selection))).rowcount
+    counts['products'] = db.session.execute(
+        Product.__table__.delete().where(Product.id.in_(selection))).rowcount
+    dashboard.mark_stale()
+    return counts
+
+
+def delete_suppliers(ids):
+    """
+    Delete suppliers, their products and reorder points are kept without one
+
+    Returns the number of rows deleted or detached, the caller commits.
+    """
+    ids = _ids(ids)
+    sync.touch(Product, Product.supplier_id.in_(ids))
+    sync.touch(Supplier, Supplier.id.in_(ids), deleted=True)
+    counts = {
+        'products': db.session.execute(Product.__table__.update()
+                                       .where(Product.supplier_id.in_(ids))
+                                       .values(supplier_id=None, version=Product.version + 1)).rowcount,
+        'reorder_points': db.session.execute(ReorderPoint.__table__.update()
+                                             .where(ReorderPoint.supplier_id.in_(ids))
+                                             .values(supplier_id=None)).rowcount,
+    }
+    counts['suppliers'] = db.session.execute(
+        Supplier.__table__.delete().where(Supplier.id.in_(ids))).rowcount
+    return counts
+
+
+def relocate(selection, text):
+    """
+    Move products to a location as typed, their stock moving along
+
+    Returns the number of products moved, the caller commits.
+    """
+    location = locations.resolve(text)
+    _take_location_stock(selection)
+    moved = select([func.coalesce(func.sum(Product.stock), 0)]) \
+        .where(Product.id.in_(selection)).as_scalar()
+    db.session.execute(Location.__table__.update().where(Location.id == location.id)
+                       .values(stock=Location.stock + moved))
+    count = db.session.execute(_table_update(Product, selection)
+                               .values(location_id=location.id, location=location.name)).rowcount
+    sync.touch(Product, Product.id.in_(selection))
+    dashboard.mark_stale()
+    return {'products': count, 'location_id': location.id}
+
+
+def change_supplier(selection, supplier_id):
+    """
+    Give products another supplier, or none
+
+    Their reorder points depend on the supplier's lead time, they are
+    dropped for the next refresh to recompute. Returns the number of rows
+    changed, the caller commits.
+    """
+    if supplier_id is not None and Supplier.query.get(supplier_id) is None:
+        raise BulkError('No supplier {}.'.format(supplier_id))
+    counts = {
+        'reorder_points': db.session.execute(
+            ReorderPoint.__table__.delete().where(ReorderPoint.product_id.in_(selection))).rowcount,
+        'products': db.session.execute(_table_update(Product, selection)
+                                       .values(supplier_id=supplier_id)).rowcount,
+    }
+    sync.touch(Product, Product.id.in_(selection))
+    return counts
+
+
+def adjust_stock(selection, quantity, entry_date=None):
+    """
+    Add a quantity to the stock of products, with a ledger entry each
+
+    Refused when a product would go below zero. Returns the number of
+    products adjusted, the caller commits.
+    """
+    entry_date = entry_date or date.today()
+    short = db.session.execute(
+        select([func.count()]).where(Product.id.in_(selection))
+        .where(func.coalesce(Product.stock, 0) + quantity < 0)).scalar()
+    if short:
+        raise BulkError('{} products would go below zero.'.format(short))
+
+    inserted_after = sync.last_id(Transaction)
+    db.session.execute(Transaction.__table__.insert().from_select(
+        ['product_id', 'date', 'quantity', 'reason'],
+        select([Product.id, literal(entry_date, db.Date), literal(quantity, db.Float),
+                literal(ledger.ADJUSTMENT, db.String)]).where(Product.id.in_(selection))))
+    adjusted = select([func.count()]) \
+        .where(Product.location_id == Location.id) \
+        .where(Product.id.in_(selection)).as_scalar()
+    held = select([Product.location_id]).where(Product.id.in_(selection)).correlate(None)
+    db.session.execute(Location.__table__.update().where(Location.id.in_(held))
+                       .values(stock=Location.stock + adjusted * quantity))
+    db.session.execute(StockSnapshot.__table__.delete()
+                       .where(StockSnapshot.product_id.in_(selection))
+                       .where(StockSnapshot.date >= entry_date))
+    count = db.session.execute(_table_update(Product, selection)
+                               .values(stock=func.coalesce(Product.stock, 0) + quantity)).rowcount
+    sync.touch(Product, Product.id.in_(selection))
+    sync.touch(Transaction, Transaction.id > inserted_after)
+    dashboard.mark_stale()
+    return {'products': count}
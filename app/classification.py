@@ -0,0 +1,86 @@
+# app/classification.py
+
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import bindparam, select
+
+from app import db, sync
+from app.forecast import consumption_matrix
+from app.models import Product
+
+
+def abc_classes(volume, a_share, b_share):
+    """
+    Rank products by volume and cut the cumulative share into A, B and C
+
+    A products make up the first a_share of the total volume, B products
+    the volume up to b_share and C products the rest.
+    """
+    classes = np.full(len(volume), 'C', dtype='<U1')
+    total = volume.sum()
+    if total <= 0:
+        return classes
+    order = np.argsort(-volume, kind='stable')
+    # share of the total reached before each product is counted
+    share = (np.cumsum(volume[order]) - volume[order]) / total
+    ranked = np.where(share < a_share, 'A', np.where(share < b_share, 'B', 'C'))
+    classes[order] = ranked
+    classes[volume <= 0] = 'C'
+    return classes
+
+
+def xyz_classes(periods, x_variation, y_variation):
+    """
+    Classify products by the coefficient of variation of their demand
+
+    periods holds the demand of each product per period. Products without
+    demand are Z.
+    """
+    mean = periods.mean(axis=1)
+    deviation = periods.std(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variation = np.where(mean > 0, deviation / mean, np.inf)
+    return np.where(variation <= x_variation, 'X',
+                    np.where(variation <= y_variation, 'Y', 'Z'))
+
+
+def refresh_classes(today=None):
+    """
+    Compute the ABC and XYZ class of every product
+
+    Volume and variability are measured on the weekly consumption over the
+    classification window. Only the products whose class changed are
+    written. Returns the number of products classified.
+    """
+    config = current_app.config
+    today = today or date.today()
+    weeks = max(config['CLASSIFICATION_WINDOW_DAYS'] // 7, 1)
+    start = today - timedelta(days=7 * weeks)
+    products = select([Product.id])
+    consumed_ids, consumed = consumption_matrix(start, today - timedelta(days=1), products)
+
+    current = db.session.execute(products.column(Product.abc_class).column(Product.xyz_class)
+                                 .order_by(Product.id)).fetchall()
+    product_ids = np.array([row[0] for row in current], dtype=np.int64)
+    if not len(product_ids):
+        return 0
+    periods = np.zeros((len(product_ids), weeks), dtype=np.float64)
+    periods[np.searchsorted(product_ids, consumed_ids)] = \
+        consumed.reshape(len(consumed_ids), weeks, 7).sum(axis=2)
+
+    abc = abc_classes(periods.sum(axis=1), *config['CLASSIFICATION_ABC_SHARES'])
+    xyz = xyz_classes(periods, *config['CLASSIFICATION_XYZ_VARIATIONS'])
+
+    changed = [{'product_id': row[0], 'abc': a, 'xyz': x}
+               for row, a, x in zip(current, abc.tolist(), xyz.tolist()) if (row[1], row[2]) != (a, x)]
+    if changed:
+        table = Product.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('product_id'))
+            .values(abc_class=bindparam('abc'), xyz_class=bindparam('xyz')), changed)
+        for position in range(0, len(changed), 500):
+            sync.touch(Product, Product.id.in_([row['product_id'] for row in changed[position:position + 500]]))
+    db.session.commit()
+    return len(product_ids)
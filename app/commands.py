@@ -0,0 +1,403 @@
+# app/commands.py
+
+import functools
+import os
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import ledger
+
+
+ledger_cli = AppGroup('ledger', help='Stock ledger maintenance.')
+forecast_cli = AppGroup('forecast', help='Demand forecasting.')
+reorder_cli = AppGroup('reorder', help='Reorder points and purchasing.')
+classification_cli = AppGroup('classification', help='ABC/XYZ classification.')
+assets_cli = AppGroup('assets', help='Static asset bundles.')
+startup_cli = AppGroup('startup', help='Cold start time.')
+bench_cli = AppGroup('bench', help='Benchmarks.')
+sessions_cli = AppGroup('sessions', help='Server-side sessions.')
+locations_cli = AppGroup('locations', help='Warehouse locations.')
+consumption_cli = AppGroup('consumption', help='Department consumption cube.')
+dashboard_cli = AppGroup('dashboard', help='Dashboard KPIs.')
+tenants_cli = AppGroup('tenants', help='Plants served by this deployment.')
+sync_cli = AppGroup('sync', help='Delta sync of handheld clients.')
+
+
+def per_tenant(command):
+    """
+    Run a command on the database of every tenant, or of the ones given
+    with --tenant
+
+    Without TENANTS the command runs once on the default database. A
+    tenant that fails does not stop the others, the command fails at the
+    end.
+    """
+    @click.option('--tenant', 'names', multiple=True,
+                  help='Tenant to run on, repeat for several, defaults to every tenant.')
+    @functools.wraps(command)
+    def run(names, **kwargs):
+        from app import tenants
+
+        configured = current_app.config['TENANTS']
+        unknown = [name for name in names if name not in configured]
+        if unknown:
+            raise click.ClickException('Unknown tenants {}.'.format(', '.join(unknown)))
+        if not configured:
+            return command(**kwargs)
+        failed = []
+        for name in names or sorted(configured):
+            click.echo('Tenant {}:'.format(name), err=True)
+            with tenants.use(name):
+                try:
+                    command(**kwargs)
+                except Exception as exception:
+                    message = exception.format_message() \
+                        if isinstance(exception, click.ClickException) else repr(exception)
+                    click.echo('{} failed: {}'.format(name, message), err=True)
+                    failed.append(name)
+        if failed:
+            raise click.ClickException('Failed on tenants {}.'.format(', '.join(failed)))
+    return run
+
+
+@ledger_cli.command('snapshot')
+@click.option('--date', 'as_of', default=None,
+              help='Day to checkpoint (YYYY-MM-DD), defaults to today.')
+@per_tenant
+def snapshot(as_of):
+    """
+    Checkpoint the stock of every product
+    """
+    if as_of is not None:
+        as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+    try:
+        count = ledger.take_snapshot(as_of)
+    except ValueError as exception:
+        raise click.ClickException(str(exception))
+    click.echo('Wrote {} stock snapshots.'.format(count))
+
+
+@ledger_cli.command('reconcile')
+@click.option('--chunk-size', default=100000,
+              help='Rows fetched from the database at a time.')
+@click.option('--fix', is_flag=True,
+              help='Write adjustment entries for every discrepancy.')
+@per_tenant
+def reconcile(chunk_size, fix):
+    """
+    Check that the stock of every product matches its transactions
+    """
+    from app.reconcile import find_discrepancies, write_adjustments
+
+    discrepancies = find_discrepancies(chunk_size)
+    click.echo('product_id,name,stock,ledger,difference')
+    for product_id, name, stock, balance in discrepancies:
+        click.echo('{},{},{},{},{}'.format(product_id, name, stock, balance,
+                                           stock - balance))
+    click.echo('{} discrepancies found.'.format(len(discrepancies)), err=True)
+    if fix and discrepancies:
+        count = write_adjustments(discrepancies)
+        click.echo('Wrote {} adjustment entries.'.format(count), err=True)
+
+
+@ledger_cli.command('archive')
+@click.option('--months', default=None, type=int,
+              help='Months kept in the database, defaults to ARCHIVE_KEEP_MONTHS.')
+@per_tenant
+def archive(months):
+    """
+    Move the transactions of closed months to the archive
+    """
+    from app.archive import archive_transactions
+
+    if months is None:
+        months = current_app.config['ARCHIVE_KEEP_MONTHS']
+    today = date.today()
+    month = today.year * 12 + today.month - 1 - months
+    cutoff = date(month // 12, month % 12 + 1, 1)
+    count = archive_transactions(cutoff)
+    click.echo('Archived {} transactions dated before {}.'.format(count, cutoff))
+
+
+@forecast_cli.command('refresh')
+@per_tenant
+def refresh():
+    """
+    Recompute the demand forecasts of every product
+    """
+    from app.forecast import refresh_forecasts
+
+    count = refresh_forecasts()
+    click.echo('Forecast {} products.'.format(count))
+
+
+@reorder_cli.command('refresh')
+@click.option('--full', is_flag=True,
+              help='Recompute every product, not only the ones with new transactions.')
+@per_tenant
+def refresh_reorder(full):
+    """
+    Recompute the reorder points of products
+    """
+    from app.reorder import refresh_reorder_points
+
+    count = refresh_reorder_points(full)
+    click.echo('Computed reorder points of {} products.'.format(count))
+
+
+@classification_cli.command('refresh')
+@per_tenant
+def refresh_classification():
+    """
+    Recompute the ABC and XYZ classes of every product
+    """
+    from app.classification import refresh_classes
+
+    count = refresh_classes()
+    click.echo('Classified {} products.'.format(count))
+
+
+@assets_cli.command('build')
+def build_assets():
+    """
+    Bundle, fingerprint and compress the static assets the templates use
+    """
+    from app.assets import build
+
+    manifest = build(current_app)
+    click.echo('Built {} assets.'.format(len(manifest)))
+
+
+@startup_cli.command('check')
+@click.option('--runs', default=5, help='Cold starts measured.')
+@click.option('--budget', default=None, type=float,
+              help='Seconds allowed, defaults to STARTUP_BUDGET_SECONDS.')
+def check_startup(runs, budget):
+    """
+    Fail when a cold start is over budget, imports a deferred module or
+    touches the database
+    """
+    from app.startup import measure
+
+    if budget is None:
+        budget = current_app.config['STARTUP_BUDGET_SECONDS']
+    seconds, modules, connections = measure(os.getenv('FLASK_CONFIG', 'development'),
+                                            current_app.config['STARTUP_DEFERRED_MODULES'], runs)
+    click.echo('create_app took {:.3f}s (budget {:.3f}s).'.format(seconds, budget))
+    failures = []
+    if seconds > budget:
+        failures.append('over budget by {:.3f}s'.format(seconds - budget))
+    if modules:
+        failures.append('imported {}'.format(', '.join(modules)))
+    if connections:
+        failures.append('opened {} database connections'.format(connections))
+    if failures:
+        raise click.ClickException('Cold start regressed: {}.'.format('; '.join(failures)))
+
+
+@bench_cli.command('listings')
+@click.option('--runs', default=3, help='Reads of each listing, the best is kept.')
+def bench_listings(runs):
+    """
+    Compare reading the list pages as ORM instances and as column projections
+    """
+    from app.benchmark import compare_listings
+
+    click.echo('listing,path,rows,seconds,peak_kb')
+    for name, path, rows, seconds, peak in compare_listings(runs):
+        click.echo('{},{},{},{:.3f},{:.0f}'.format(name, path, rows, seconds, peak / 1024))
+
+
+@bench_cli.command('logins')
+@click.option('--logins', default=200, help='Logins attempted.')
+@click.option('--concurrency', default=50, help='Logins attempted at once.')
+@click.option('--method', default=None,
+              help='Hashing method to try, defaults to PASSWORD_HASH_METHOD.')
+@click.option('--workers', default=None, type=int,
+              help='Hashes run at once, defaults to PASSWORD_HASH_WORKERS.')
+def bench_logins(logins, concurrency, method, workers):
+    """
+    Measure login throughput and latency under a burst of logins
+    """
+    from app.benchmark import login_throughput
+
+    if method is not None:
+        current_app.config['PASSWORD_HASH_METHOD'] = method
+    if workers is not None:
+        current_app.config['PASSWORD_HASH_WORKERS'] = workers
+    rate, median, slowest, busy = login_throughput(logins, concurrency)
+    click.echo('{} at {} workers: {:.1f} logins/s, median {}, p95 {}, {} turned away.'.format(
+        current_app.config['PASSWORD_HASH_METHOD'], current_app.config['PASSWORD_HASH_WORKERS'],
+        rate, '{:.3f}s'.format(median) if median is not None else '-',
+        '{:.3f}s'.format(slowest) if slowest is not None else '-', busy))
+
+
+@bench_cli.command('scans')
+@click.option('--events', default=2000, help='Scan events booked by each path.')
+@click.option('--concurrency', default=50, help='Callers posting at once.')
+def bench_scans(events, concurrency):
+    """
+    Compare booking scans one commit each and through the group committer
+    """
+    from app.benchmark import scan_throughput
+
+    (single, single_failed), (grouped, grouped_failed) = scan_throughput(events, concurrency)
+    click.echo('One commit per event: {:.0f} events/s, {} failed.'.format(single, single_failed))
+    click.echo('Group commit: {:.0f} events/s, {} failed.'.format(grouped, grouped_failed))
+
+
+@sessions_cli.command('revoke')
+@click.argument('email')
+@per_tenant
+def revoke_sessions(email):
+    """
+    Log an employee out everywhere
+    """
+    from app.models import Employee
+    from app.sessions import revoke
+
+    if current_app.config['SESSION_BACKEND'] is None:
+        raise click.ClickException('SESSION_BACKEND is not set.')
+    employee = Employee.query.filter_by(email=email).first()
+    if employee is None:
+        raise click.ClickException('No employee with email {}.'.format(email))
+    click.echo('Revoked {} sessions.'.format(revoke(employee.id)))
+
+
+@sessions_cli.command('purge')
+@per_tenant
+def purge_sessions():
+    """
+    Delete expired sessions
+    """
+    from app.sessions import purge
+
+    if current_app.config['SESSION_BACKEND'] is None:
+        raise click.ClickException('SESSION_BACKEND is not set.')
+    click.echo('Deleted {} expired sessions.'.format(purge()))
+
+
+@locations_cli.command('rebuild')
+@per_tenant
+def rebuild_locations():
+    """
+    Recompute the stock held at every location
+    """
+    from app.locations import rebuild
+
+    click.echo('Rebuilt the stock of {} locations.'.format(rebuild()))
+
+
+@consumption_cli.command('rebuild')
+@per_tenant
+def rebuild_consumption():
+    """
+    Recompute the consumption cube from the shipments
+    """
+    from app.consumption import rebuild
+
+    click.echo('Rebuilt {} consumption cells.'.format(rebuild()))
+
+
+@dashboard_cli.command('refresh')
+@per_tenant
+def refresh_dashboard():
+    """
+    Recompute the KPI snapshot of the dashboard
+    """
+    from app.dashboard import refresh
+
+    kpis, computed_at = refresh()
+    click.echo('Refreshed {} KPIs at {:%Y-%m-%d %H:%M:%S}.'.format(len(kpis), computed_at))
+
+
+@sync_cli.command('purge')
+@click.option('--before', required=True, type=int,
+              help='Version whose older tombstones are deleted.')
+@per_tenant
+def purge_tombstones(before):
+    """
+    Delete old tombstones, clients that synced before them resync in full
+    """
+    from app import db
+    from app.sync import purge
+
+    try:
+        count = purge(before)
+    except ValueError as exception:
+        db.session.rollback()
+        raise click.ClickException(str(exception))
+    db.session.commit()
+    click.echo('Deleted {} tombstones older than version {}.'.format(count, before))
+
+
+@tenants_cli.command('list')
+def list_tenants():
+    """
+    Show the configured tenants and their databases
+    """
+    for name, tenant in sorted(current_app.config['TENANTS'].items()):
+        schema = tenant.get('schema')
+        click.echo('{}: {}{}'.format(name, tenant['uri'],
+                                     ' (schema {})'.format(schema) if schema else ''))
+
+
+@tenants_cli.command('upgrade')
+@click.argument('revision', default='head')
+@click.option('--workers', default=None, type=int,
+              help='Tenants migrated at once, defaults to TENANT_MIGRATION_WORKERS.')
+def upgrade_tenants(revision, workers):
+    """
+    Migrate the database of every tenant
+    """
+    from app.tenants import upgrade
+
+    if not current_app.config['TENANTS']:
+        raise click.ClickException('TENANTS is not set.')
+    failed = 0
+    for name, returncode, output in upgrade(current_app, revision, workers):
+        click.echo('{}: {}'.format(name, 'ok' if returncode == 0 else 'failed'))
+        if returncode != 0:
+            failed += 1
+            click.echo(output)
+    if failed:
+        raise click.ClickException('{} tenants failed to migrate.'.format(failed))
+
+
+@tenants_cli.command('add-admin')
+@click.argument('email')
+@click.option('--name', default='Admin User', help='Full name of the employee.')
+@click.password_option()
+@per_tenant
+def add_admin(email, name, password):
+    """
+    Add an admin employee, the first one of a new plant
+    """
+    from app import db
+    from app.models import Employee
+
+    if Employee.query.filter_by(email=email).first() is not None:
+        raise click.ClickException('An employee with email {} exists.'.format(email))
+    db.session.add(Employee(email=email, username=email.split('@')[0], name=name,
+                            role='CEO', password=password))
+    db.session.commit()
+    click.echo('Added admin {}.'.format(email))
+
+
+def register_commands(app):
+    app.cli.add_command(ledger_cli)
+    app.cli.add_command(forecast_cli)
+    app.cli.add_command(reorder_cli)
+    app.cli.add_command(classification_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(startup_cli)
+    app.cli.add_command(bench_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(locations_cli)
+    app.cli.add_command(consumption_cli)
+    app.cli.add_command(dashboard_cli)
+    app.cli.add_command(tenants_cli)
+    app.cli.add_command(sync_cli)
@@ -0,0 +1,139 @@
+# app/consumption.py
+
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, func
+
+from app import db
+from app.models import ConsumptionCell, Location, Product, Shipment
+
+
+cube = ConsumptionCell.__table__
+
+# Levels the cube is cut by, in the order the dashboard drills down
+LEVELS = ('department', 'month', 'product', 'location')
+
+COLUMNS = {
+    'department': cube.c.department,
+    'month': cube.c.month,
+    'product': cube.c.product_id,
+    'location': cube.c.location_id,
+}
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def parse_month(text):
+    """
+    Read a month as YYYY-MM, returns its first day
+    """
+    return datetime.strptime(text, '%Y-%m').date()
+
+
+def _add(month, department, product_id, location_id, quantity, shipments):
+    """
+    Add to a cell in the current transaction, created on first use and
+    dropped once it holds no shipment
+    """
+    where = and_(cube.c.month == month, cube.c.department == department,
+                 cube.c.product_id == product_id, cube.c.location_id == location_id)
+    result = db.session.execute(cube.update().where(where)
+                                .values(quantity=cube.c.quantity + quantity,
+                                        shipments=cube.c.shipments + shipments))
+    if result.rowcount == 0:
+        db.session.execute(cube.insert().values(month=month, department=department,
+                                                product_id=product_id, location_id=location_id,
+                                                quantity=quantity, shipments=shipments))
+    elif shipments < 0:
+        db.session.execute(cube.delete().where(where).where(cube.c.shipments <= 0))
+
+
+def book(shipment, sign=1):
+    """
+    Add a shipment to its cell, or take it back out with sign -1
+
+    Call it with -1 before changing or deleting a shipment and with 1 once
+    it is changed, in the transaction of the change.
+    """
+    product_id = shipment.product.id if shipment.product is not None else shipment.product_id
+    _add(month_of(shipment.shipment_date), shipment.department, product_id,
+         shipment.location_id, sign * (shipment.quantity or 0), sign)
+
+
+def rebuild():
+    """
+    Recompute the whole cube from the shipments, returns the number of cells
+    """
+    cells = defaultdict(lambda: [0.0, 0])
+    rows = db.session.query(Shipment.shipment_date, Shipment.department, Shipment.product_id,
+                            Shipment.location_id, func.sum(Shipment.quantity), func.count(Shipment.id)) \
+        .filter(Shipment.shipment_date.isnot(None)) \
+        .group_by(Shipment.shipment_date, Shipment.department, Shipment.product_id,
+                  Shipment.location_id)
+    for day, department, product_id, location_id, quantity, count in rows:
+        cell = cells[(month_of(day), department, product_id, location_id)]
+        cell[0] += quantity or 0
+        cell[1] += count
+    db.session.execute(cube.delete())
+    if cells:
+        db.session.execute(cube.insert(), [
+            {'month': month, 'department': department, 'product_id': product_id,
+             'location_id': location_id, 'quantity': quantity, 'shipments': count}
+            for (month, department, product_id, location_id), (quantity, count) in cells.items()])
+    db.session.commit()
+    return len(cells)
+
+
+def drill(levels, department=None, month=None, product_id=None, location_id=None,
+          from_month=None, to_month=None):
+    """
+    Sum the cube by some levels, filtered on the others
+
+    Reads the cube alone, so the cost follows the number of cells and not
+    the number of shipments behind them. Returns a dict per group with the
+    value of each level, the names of products and locations, the quantity
+    and the number of shipments.
+    """
+    columns = [COLUMNS[level].label(level) for level in levels]
+    query = db.session.query(*columns).select_from(cube)
+    groups = list(columns)
+    if 'product' in levels:
+        query = query.add_columns(Product.name.label('product_name')) \
+            .outerjoin(Product, Product.id == cube.c.product_id)
+        groups.append(Product.name)
+    if 'location' in levels:
+        query = query.add_columns(Location.name.label('location_name')) \
+            .outerjoin(Location, Location.id == cube.c.location_id)
+        groups.append(Location.name)
+    query = query.add_columns(func.sum(cube.c.quantity).label('quantity'),
+                              func.sum(cube.c.shipments).label('shipments'))
+
+    if department is not None:
+        query = query.filter(cube.c.department == department)
+    if month is not None:
+        query = query.filter(cube.c.month == month)
+    if product_id is not None:
+        query = query.filter(cube.c.product_id == product_id)
+    if location_id is not None:
+        query = query.filter(cube.c.location_id == location_id)
+    if from_month is not None:
+        query = query.filter(cube.c.month >= from_month)
+    if to_month is not None:
+        query = query.filter(cube.c.month <= to_month)
+
+    query = query.group_by(*groups)
+    if 'month' in levels:
+        query = query.order_by(cube.c.month, func.sum(cube.c.quantity).desc())
+    else:
+        query = query.order_by(func.sum(cube.c.quantity).desc())
+
+    cells = []
+    for row in query:
+        cell = row._asdict()
+        if 'month' in cell:
+            cell['month'] = cell['month'].strftime('%Y-%m')
+        cells.append(cell)
+    return cells
@@ -0,0 +1,217 @@
+# app/dashboard.py
+
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from itertools import chain
+
+from flask import current_app
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import case, event, func
+
+from app import db, ledger, tenants
+from app.models import KpiSnapshot, Location, Product, Shipment, Transaction
+
+
+snapshots = KpiSnapshot.__table__
+
+# Rows whose changes make the KPIs stale
+WATCHED = (Product, Location, Shipment, Transaction)
+
+_lock = threading.Lock()
+
+
+def _volume(start, end):
+    """
+    Sum the stock received and consumed between two days
+    """
+    consumed = Transaction.reason.in_(ledger.CONSUMPTION)
+    inbound = func.sum(case([(~consumed & (Transaction.quantity > 0), Transaction.quantity)], else_=0))
+    outbound = func.sum(case([(consumed, -Transaction.quantity)], else_=0))
+    row = db.session.query(inbound, outbound) \
+        .filter(Transaction.date >= start, Transaction.date <= end,
+                ledger.is_movement(Transaction.reason)).one()
+    return {'in': row[0] or 0, 'out': row[1] or 0}
+
+
+def compute(today=None):
+    """
+    Compute every KPI of the dashboard, by name
+    """
+    config = current_app.config
+    today = today or date.today()
+    top = config['DASHBOARD_TOP']
+    kpis = {}
+
+    # stock by location, read from the location aggregates
+    total, unplaced = db.session.query(
+        func.coalesce(func.sum(Product.stock), 0),
+        func.coalesce(func.sum(case([(Product.location_id.is_(None), Product.stock)], else_=0)), 0)).one()
+    kpis['stock'] = {
+        'total': total,
+        'unplaced': unplaced,
+        'locations': [{'id': location.id, 'name': location.name, 'stock': location.stock}
+                      for location in Location.query.order_by(Location.stock.desc()).limit(top)],
+    }
+
+    # lots expiring, products carry their own expiry date, used up lots
+    # are left out
+    windows = {}
+    for days in config['DASHBOARD_EXPIRY_DAYS']:
+        lots, stock = db.session.query(func.count(Product.id), func.coalesce(func.sum(Product.stock), 0)) \
+            .filter(Product.exp_date >= today, Product.exp_date <= today + timedelta(days=days),
+                    Product.stock > 0).one()
+        windows[str(days)] = {'lots': lots, 'stock': stock}
+    soonest = Product.query \
+        .filter(Product.exp_date >= today,
+                Product.exp_date <= today + timedelta(days=max(config['DASHBOARD_EXPIRY_DAYS'])),
+                Product.stock > 0) \
+        .order_by(Product.exp_date).limit(top)
+    kpis['expiring'] = {
+        'windows': windows,
+        'lots': [{'id': product.id, 'name': product.name, 'exp_date': product.exp_date.isoformat(),
+                  'stock': product.stock} for product in soonest],
+    }
+
+    # inbound and outbound volume
+    kpis['volume'] = {
+        'today': _volume(today, today),
+        'week': _volume(today - timedelta(days=today.weekday()), today),
+    }
+
+    # top movers, by stock received and consumed
+    since = today - timedelta(days=config['DASHBOARD_MOVER_DAYS'] - 1)
+    consumed = Transaction.reason.in_(ledger.CONSUMPTION)
+    inbound = func.sum(case([(~consumed & (Transaction.quantity > 0), Transaction.quantity)], else_=0))
+    outbound = func.sum(case([(consumed, -Transaction.quantity)], else_=0))
+    moved = inbound + outbound
+    rows = db.session.query(Product.id, Product.name, inbound, outbound) \
+        .join(Transaction, Transaction.product_id == Product.id) \
+        .filter(Transaction.date >= since, Transaction.date <= today,
+                ledger.is_movement(Transaction.reason)) \
+        .group_by(Product.id, Product.name) \
+        .order_by(moved.desc()).limit(top)
+    kpis['movers'] = {
+        'days': config['DASHBOARD_MOVER_DAYS'],
+        'products': [{'id': product_id, 'name': name, 'in': stock_in or 0, 'out': stock_out or 0}
+                     for product_id, name, stock_in, stock_out in rows],
+    }
+    return kpis
+
+
+def refresh():
+    """
+    Store a fresh snapshot of the KPIs, returns it
+    """
+    # local time, the day the KPIs count is the day of computed_at
+    now = datetime.now()
+    kpis = compute(now.date())
+    db.session.execute(snapshots.delete())
+    db.session.execute(snapshots.insert(), [
+        {'name': name, 'value': json.dumps(value), 'computed_at': now}
+        for name, value in kpis.items()])
+    db.session.commit()
+    return kpis, now
+
+
+def snapshot():
+    """
+    Return the stored KPIs and when they were computed
+
+    A snapshot older than DASHBOARD_MAX_AGE_SECONDS, or from another day,
+    is still returned while a fresh one is computed in the background.
+    Only the very first read computes one on the spot.
+    """
+    rows = db.session.execute(snapshots.select()).fetchall()
+    if not rows:
+        return refresh()
+    computed_at = min(row.computed_at for row in rows)
+    now = datetime.now()
+    if (now - computed_at).total_seconds() > current_app.config['DASHBOARD_MAX_AGE_SECONDS'] \
+            or computed_at.date() != now.date():
+        schedule()
+    return {row.name: json.loads(row.value) for row in rows}, computed_at
+
+
+class Refresher(object):
+    """
+    Refresh the snapshot of one tenant in the background
+
+    Writes ask for a refresh, which runs at most once every
+    DASHBOARD_REFRESH_SECONDS however many writes asked for it.
+    """
+
+    def __init__(self, app, tenant=None):
+        self.app = app
+        self.tenant = tenant
+        self.interval = app.config['DASHBOARD_REFRESH_SECONDS']
+        self._wanted = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request(self):
+        self._start()
+        self._wanted.set()
+
+    def _start(self):
+        # started on first use, so that each worker process gets its own
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='dashboard', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            with self.app.app_context():
+                tenants.switch(self.tenant)
+                try:
+                    refresh()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Dashboard refresh failed')
+                finally:
+                    db.session.remove()
+            # writes during the pause are picked up by the next round
+            time.sleep(self.interval)
+
+
+def schedule():
+    """
+    Ask for a background refresh of the current tenant's snapshot
+    """
+    tenant = tenants.current()
+    refresher = current_app.extensions.get('dashboard', {}).get(tenant)
+    if refresher is None:
+        with _lock:
+            refresher = current_app.extensions.setdefault('dashboard', {}).setdefault(
+                tenant, Refresher(current_app._get_current_object(), tenant))
+    refresher.request()
+
+
+def mark_stale():
+    """
+    Refresh the snapshot once the current transaction commits, for writes
+    made with Core statements
+    """
+    db.session.info['dashboard_stale'] = True
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def _watch_flush(session, flush_context):
+    if any(isinstance(instance, WATCHED) for instance in chain(session.new, session.dirty, session.deleted)):
+        session.info['dashboard_stale'] = True
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def _watch_commit(session):
+    if session.info.pop('dashboard_stale', False):
+        schedule()
+
+
+@event.listens_for(SignallingSession, 'after_rollback')
+def _watch_rollback(session):
+    session.info.pop('dashboard_stale', None)
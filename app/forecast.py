@@ -0,0 +1,134 @@
+# app/forecast.py
+
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import and_, func, select
+
+from app import db, ledger
+from app.models import Forecast, Transaction
+
+
+MOVING_AVERAGE = 'moving_average'
+EXPONENTIAL_SMOOTHING = 'exponential_smoothing'
+SEASONAL_NAIVE = 'seasonal_naive'
+
+# Length of the season used by the seasonal naive model, in days
+SEASON = 7
+
+
+def consumption_matrix(start, end, products=None):
+    """
+    Load the daily consumption of every product between two dates
+
+    Consumption is the outbound quantity booked by shipments and picks, net
+    of shipment reversals. Pass a selectable of product ids as products to load only
+    those. Returns the sorted ids of the products that had consumption and a
+    (products x days) array, both built from a single grouped query.
+    """
+    criteria = [Transaction.reason.in_(ledger.CONSUMPTION),
+                Transaction.product_id.isnot(None),
+                Transaction.date >= start,
+                Transaction.date <= end]
+    if products is not None:
+        criteria.append(Transaction.product_id.in_(products))
+    rows = db.session.execute(
+        select([Transaction.product_id, Transaction.date, func.sum(Transaction.quantity)])
+        .where(and_(*criteria))
+        .group_by(Transaction.product_id, Transaction.date)).fetchall()
+
+    days = (end - start).days + 1
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, days), dtype=np.float32)
+    product_ids, dates, quantities = zip(*rows)
+    product_ids, rows_index = np.unique(np.array(product_ids, dtype=np.int64),
+                                        return_inverse=True)
+    days_index = np.fromiter((d.toordinal() for d in dates), dtype=np.int64,
+                             count=len(dates)) - start.toordinal()
+    matrix = np.zeros((len(product_ids), days), dtype=np.float32)
+    np.add.at(matrix, (rows_index, days_index), -np.array(quantities, dtype=np.float32))
+    return product_ids, matrix
+
+
+def moving_average(history, horizon, window):
+    """
+    Forecast every day of the horizon as the mean of the last window days
+    """
+    level = history[:, -window:].mean(axis=1)
+    return np.repeat(level[:, np.newaxis], horizon, axis=1)
+
+
+def exponential_smoothing(history, horizon, alpha):
+    """
+    Forecast every day of the horizon as the exponentially smoothed level
+
+    The loop runs over days and updates every product at once.
+    """
+    level = history[:, 0].copy()
+    for day in range(1, history.shape[1]):
+        level += alpha * (history[:, day] - level)
+    return np.repeat(level[:, np.newaxis], horizon, axis=1)
+
+
+def seasonal_naive(history, horizon, season=SEASON):
+    """
+    Forecast every day of the horizon as the same day of the last season
+    """
+    repeats = -(-horizon // season)
+    return np.tile(history[:, -season:], repeats)[:, :horizon]
+
+
+def _fit(history, horizon, config):
+    return {
+        MOVING_AVERAGE: moving_average(history, horizon,
+                                       config['FORECAST_WINDOW_DAYS']),
+        EXPONENTIAL_SMOOTHING: exponential_smoothing(history, horizon,
+                                                     config['FORECAST_ALPHA']),
+        SEASONAL_NAIVE: seasonal_naive(history, horizon),
+    }
+
+
+def refresh_forecasts(today=None):
+    """
+    Fit every model for every product and replace the stored forecasts
+
+    Each model is first fitted without the last horizon days and scored on
+    them (mean absolute error), then refitted on the full history.
+    Returns the number of products forecast.
+    """
+    config = current_app.config
+    today = today or date.today()
+    horizon = config['FORECAST_HORIZON_DAYS']
+    start = today - timedelta(days=config['FORECAST_HISTORY_DAYS'])
+    product_ids, history = consumption_matrix(start, today - timedelta(days=1))
+
+    # without enough history to score the models the moving average is kept
+    models = [MOVING_AVERAGE, EXPONENTIAL_SMOOTHING, SEASONAL_NAIVE]
+    errors = {}
+    best = np.zeros(len(product_ids), dtype=np.int64)
+    if history.shape[1] >= 2 * horizon:
+        holdout = history[:, -horizon:]
+        for model, predicted in _fit(history[:, :-horizon], horizon, config).items():
+            errors[model] = np.abs(predicted - holdout).mean(axis=1)
+        best = np.vstack([errors[model] for model in models]).argmin(axis=0)
+
+    mappings = []
+    for model, predicted in _fit(history, horizon, config).items():
+        quantities = predicted.sum(axis=1).tolist()
+        error = errors[model].tolist() if model in errors else [None] * len(quantities)
+        is_best = (best == models.index(model)).tolist()
+        mappings.extend({'product_id': product_id,
+                         'model': model,
+                         'generated_on': today,
+                         'horizon': horizon,
+                         'quantity': quantity,
+                         'error': error_value,
+                         'best': best_value}
+                        for product_id, quantity, error_value, best_value
+                        in zip(product_ids.tolist(), quantities, error, is_best))
+
+    Forecast.query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(Forecast, mappings)
+    db.session.commit()
+    return len(product_ids)
@@ -0,0 +1,7 @@
+# app/health/__init__.py
+
+from flask import Blueprint
+
+health = Blueprint('health', __name__)
+
+from . import views
\ No newline at end of file
@@ -0,0 +1,110 @@
+# app/health/views.py
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from alembic.script import ScriptDirectory
+from flask import abort, current_app, jsonify, request
+from flask_login import current_user
+from sqlalchemy import text
+
+from . import health
+from .. import db, stats, tenants
+
+
+# Each tenant's probes run on a thread of its own, one at a time, and a
+# database has at most one probe in flight, later checks wait on it, so a
+# stuck database cannot pile them up nor hold up the other tenants
+_probes = {}
+_inflight = {}
+_heads = {}
+_lock = threading.Lock()
+
+
+def _migration_heads():
+    """
+    Return the head revisions of the migration scripts, read once
+    """
+    directory = current_app.extensions['migrate'].directory
+    if not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(current_app.root_path), directory)
+    with _lock:
+        if directory not in _heads:
+            _heads[directory] = set(ScriptDirectory(directory).get_heads())
+    return _heads[directory]
+
+
+def _database_revisions(engine):
+    with engine.connect() as connection:
+        return set(row[0] for row in connection.execute(text('SELECT version_num FROM alembic_version')))
+
+
+def _probe(tenant, engine):
+    """
+    Return the probe of a tenant's database in flight, or start one
+    """
+    with _lock:
+        future = _inflight.get(tenant)
+        if future is None or future.done():
+            if tenant not in _probes:
+                _probes[tenant] = ThreadPoolExecutor(1, thread_name_prefix='readyz')
+            future = _inflight[tenant] = _probes[tenant].submit(_database_revisions, engine)
+    return future
+
+
+@health.route('/healthz')
+def healthz():
+    """
+    Answer while the process is able to serve requests
+    """
+    return jsonify(status='ok')
+
+
+@health.route('/readyz')
+def readyz():
+    """
+    Answer when the database is reachable and its schema at the head
+    migration, within READY_TIMEOUT_SECONDS
+    """
+    start = time.perf_counter()
+    try:
+        revisions = _probe(tenants.current(), db.engine).result(timeout=current_app.config['READY_TIMEOUT_SECONDS'])
+    except TimeoutError:
+        return jsonify(status='unavailable', error='database probe timed out'), 503
+    except Exception as exception:
+        return jsonify(status='unavailable', error=str(exception)), 503
+    heads = _migration_heads()
+    milliseconds = round((time.perf_counter() - start) * 1000, 1)
+    if revisions != heads:
+        return jsonify(status='unavailable', error='migrations not at head',
+                       database=sorted(revisions), head=sorted(heads),
+                       milliseconds=milliseconds), 503
+    return jsonify(status='ok', milliseconds=milliseconds)
+
+
+@health.route('/internal/stats')
+def internal_stats():
+    """
+    Return resource statistics of this worker
+    Open to STATS_ALLOWED_ADDRESSES and to admins
+    """
+    if request.remote_addr not in current_app.config['STATS_ALLOWED_ADDRESSES'] and \
+            not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    in_flight = current_app.extensions['in_flight']
+    caches = {}
+    if hasattr(current_app.session_interface, 'cache'):
+        caches['sessions'] = current_app.session_interface.cache.stats()
+    scans = current_app.extensions.get('scans', {})
+    engines = current_app.extensions.get('tenants')
+    return jsonify(pid=os.getpid(),
+                   uptime=round(time.time() - in_flight.started, 1),
+                   requests={'in_flight': in_flight.count, 'served': in_flight.served},
+                   memory=stats.memory(),
+                   pool=stats.pool(db.engine),
+                   caches=caches,
+                   scan_queue=sum(committer.pending() for committer in scans.values()),
+                   tenant=tenants.current(),
+                   tenants=engines.stats() if engines is not None else None)
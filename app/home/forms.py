@@ -2,12 +2,20 @@
 
 from flask_wtf import FlaskForm
 from wtforms.fields.html5 import DateField
-from wtforms import StringField, SubmitField, ValidationError, SelectField, FloatField
-from wtforms.validators import DataRequired, Email
+from wtforms import StringField, SubmitField, ValidationError, SelectField, FloatField, IntegerField, \
+    HiddenField
+from wtforms.validators import DataRequired, Email, NumberRange, Optional
 from wtforms.ext.sqlalchemy.fields import QuerySelectField
 from ..models import Product, Supplier, Shipment
 
 
+def _version(value):
+    """
+    Read the version of a hidden field, empty on add forms
+    """
+    return int(value) if value not in (None, '') else None
+
+
 class ProductForm(FlaskForm):
     """
     Form to add or edit a Product
@@ -21,6 +29,8 @@ class ProductForm(FlaskForm):
     supplier = QuerySelectField('Supplier', validators=[DataRequired()],
                                 query_factory=lambda: Supplier.query.all(),
                                 get_label="name")
+    # version of the product the form was filled from
+    version = HiddenField(filters=[_version])
 
     submit = SubmitField('Submit')
 
@@ -33,6 +43,8 @@ class SupplierForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
     contact = StringField('Contact', validators=[DataRequired()])
     address = StringField('Address', validators=[DataRequired()])
+    lead_time = IntegerField('Lead Time (days)', validators=[Optional(), NumberRange(min=0)])
+    version = HiddenField(filters=[_version])
     submit = SubmitField('Submit')
 
 
@@ -49,4 +61,5 @@ class ShipmentForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
     quantity = FloatField('Quantity', validators=[DataRequired()])
     shipment_date = DateField('Shipment Date', validators=[DataRequired()])
+    version = HiddenField(filters=[_version])
     submit = SubmitField('Submit')
@@ -1,15 +1,84 @@
 # app/home/views.py
 
+from concurrent.futures import TimeoutError
+from datetime import date, datetime
+from itertools import groupby
+
 from flask_login import login_required, current_user
-from flask import abort, flash, redirect, render_template, url_for, request
+from flask import abort, current_app, flash, get_flashed_messages, jsonify, redirect, \
+    render_template, url_for, request, Response, stream_with_context
 from sqlalchemy import func, case, literal_column, select
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.sql import label
-import pandas as pd
 
 from app.home.forms import ProductForm, SupplierForm, ShipmentForm
 from . import home
-from ..models import Product, Supplier, Shipment, Transaction
-from .. import db
+from ..models import Forecast, Location, Product, ReorderPoint, Supplier, Shipment, Transaction
+from .. import bulk, consumption, dashboard, db, ledger, listings, locations, scans, search, sync, \
+    timeseries
+
+
+# Template chunks rendered before each write of a streamed response
+STREAM_BUFFER = 100
+
+# Rows fetched from the database at a time by streamed listings
+STREAM_ROWS = 1000
+
+
+def _filter_by_class(query):
+    """
+    Filter a product query on the abc and xyz arguments of the request
+    """
+    if request.args.get('abc'):
+        query = query.filter(Product.abc_class == request.args['abc'])
+    if request.args.get('xyz'):
+        query = query.filter(Product.xyz_class == request.args['xyz'])
+    return query
+
+
+def _stream_template(template_name, **context):
+    """
+    Render a template as a streamed response, sent as it is generated
+
+    Rows passed in as iterators are only read while their part of the page
+    is rendered, so the whole page is never held in memory.
+    """
+    # flashed messages are popped from the session, which has to happen
+    # before the response starts and the session cookie is written
+    get_flashed_messages(with_categories=True)
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+    return Response(stream_with_context(stream))
+
+
+def _check_version(form, row):
+    """
+    Refuse an edit made on a form filled from an older version of a row
+
+    Saving the row is refused the same way when it changes between here
+    and the commit, see version_id_col in app/models.py.
+    """
+    if form.version.data != row.version:
+        raise StaleDataError('{!r} was changed since the form was filled.'.format(row))
+
+
+def _conflict(kind):
+    """
+    Roll back an edit made on an older version of a row
+    """
+    db.session.rollback()
+    flash('This {} was changed by someone else while you were editing it. '
+          'Review its current values and save again.'.format(kind))
+
+
+def _busy(kind):
+    """
+    Roll back a write that raced another change of the same row
+    """
+    db.session.rollback()
+    flash('This {} was changed by someone else at the same time. '
+          'Nothing was saved, please try again.'.format(kind))
 
 
 @home.route('/')
@@ -20,14 +89,40 @@ def index():
     return render_template('home/index.html', title="P3I")
 
 
+@home.route('/dashboard')
+@login_required
+def show_dashboard():
+    """
+    Render the dashboard template on the /dashboard route
+    The KPIs are read from their precomputed snapshot
+    """
+    kpis, computed_at = dashboard.snapshot()
+    return render_template('home/dashboard.html', kpis=kpis, computed_at=computed_at,
+                           title="Dashboard")
+
+
+@home.route('/api/dashboard')
+@login_required
+def api_dashboard():
+    """
+    Return the precomputed KPIs of the dashboard as JSON
+    """
+    kpis, computed_at = dashboard.snapshot()
+    return jsonify(computed_at=computed_at.isoformat(), **kpis)
+
+
 @home.route('/products')
 @login_required
 def list_products():
     """
     Render the home template on the / route
+    Filter with abc and xyz, pass sort=class to order by class
     """
-    products = Product.query.all()
-    return render_template('home/products/list.html', products=products, title="Products")
+    query = _filter_by_class(listings.product_rows())
+    if request.args.get('sort') == 'class':
+        query = query.order_by(Product.abc_class, Product.xyz_class)
+    products = query.yield_per(STREAM_ROWS)
+    return _stream_template('home/products/list.html', products=products, title="Products")
 
 
 @home.route('/products/add', methods=['GET', 'POST'])
@@ -45,24 +140,20 @@ def add_product():
                           mfg_date=form.mfg_date.data,
                           exp_date=form.exp_date.data,
                           rcv_date=form.rcv_date.data,
-                          location=form.location.data,
-                          stock=form.stock.data,
+                          stock=0,
                           supplier=form.supplier.data)
         try:
-            # add product and a transaction to the database
-            if product.stock <= 0:
+            # add product and its receipt to the database
+            if form.stock.data <= 0:
                 flash('Invalid stock entry, please enter a positive number!')
             else:
-                transaction = Transaction(
-                    product=product,
-                    date=product.rcv_date,
-                    quantity=product.stock
-                )
                 db.session.add(product)
-                db.session.add(transaction)
+                locations.place(product, form.location.data)
+                ledger.record(product, form.stock.data, product.rcv_date, ledger.RECEIPT)
                 db.session.commit()
                 flash('You have successfully added a new product.')
         except:
+            db.session.rollback()
             flash('Error: An error occurred.')
 
         # redirect to departments page
@@ -87,30 +178,45 @@ def edit_product(id):
 
     product = Product.query.get_or_404(id)
     form = ProductForm(obj=product)
+    status = 200
     if form.validate_on_submit():
-        product.name = form.name.data
-        product.mfg_date = form.mfg_date.data
-        product.exp_date = form.exp_date.data
-        product.rcv_date = form.rcv_date.data
-        product.location = form.location.data
-        product.stock = form.stock.data
-        product.supplier = form.supplier.data
-        db.session.commit()
-        flash('You have successfully edited the product.')
+        try:
+            _check_version(form, product)
+            product.name = form.name.data
+            product.mfg_date = form.mfg_date.data
+            product.exp_date = form.exp_date.data
+            product.rcv_date = form.rcv_date.data
+            locations.place(product, form.location.data)
+            product.supplier = form.supplier.data
+            # record a stock correction as an adjustment rather than overwriting it
+            delta = form.stock.data - (product.stock or 0)
+            if delta:
+                ledger.record(product, delta, date.today(), ledger.ADJUSTMENT)
+            db.session.commit()
+        except StaleDataError:
+            _conflict('product')
+            product = Product.query.get_or_404(id)
+            # filled from the current row, not from what was posted
+            form = ProductForm(formdata=None, obj=product)
+            status = 409
+        else:
+            flash('You have successfully edited the product.')
 
-        # redirect to the departments page
-        return redirect(url_for('home.list_products'))
+            # redirect to the departments page
+            return redirect(url_for('home.list_products'))
 
     form.name.data = product.name
     form.mfg_date.data = product.mfg_date
     form.exp_date.data = product.exp_date
     form.rcv_date.data = product.rcv_date
+    form.location.data = product.location
     form.stock.data = product.stock
     form.supplier.data = product.supplier
+    form.version.data = product.version
 
     return render_template('home/products/add.html', action="Edit",
                            add_product=_add_product, form=form,
-                           product=product, title="Edit Product")
+                           product=product, title="Edit Product"), status
 
 
 @home.route('/products/delete/<int:id>', methods=['GET', 'POST'])
@@ -122,7 +228,7 @@ def delete_product(id):
     if not current_user.is_admin:
         abort(403)
     product = Product.query.get_or_404(id)
-    db.session.delete(product)
+    bulk.delete_products(bulk.products(ids=[product.id]))
     db.session.commit()
     flash('You have successfully deleted the product.')
 
@@ -136,7 +242,7 @@ def list_suppliers():
     """
     Render the home template on the /suppliers route
     """
-    suppliers = Supplier.query.all()
+    suppliers = listings.supplier_rows().all()
     return render_template('home/suppliers/list.html', suppliers=suppliers, title="Suppliers")
 
 
@@ -154,7 +260,8 @@ def add_supplier():
         supplier = Supplier(name=form.name.data,
                             email=form.email.data,
                             contact=form.contact.data,
-                            address=form.address.data)
+                            address=form.address.data,
+                            lead_time=form.lead_time.data)
         try:
             # add supplier to the database
             db.session.add(supplier)
@@ -183,24 +290,37 @@ def edit_supplier(id):
 
     supplier = Supplier.query.get_or_404(id)
     form = SupplierForm(obj=supplier)
+    status = 200
     if form.validate_on_submit():
-        supplier.name = form.name.data
-        supplier.email = form.email.data
-        supplier.contact = form.contact.data
-        supplier.address = form.address.data
-        db.session.commit()
-        flash('You have successfully edited the supplier.')
-
-        # redirect to the departments page
-        return redirect(url_for('home.list_suppliers'))
-    else:
-        form.name.data = supplier.name
-        form.email.data = supplier.email
-        form.contact.data = supplier.contact
-        form.address.data = supplier.address
-        return render_template('home/suppliers/add.html', action="Edit",
-                               add_supplier=_add_supplier, form=form,
-                               supplier=supplier, title="Edit Supplier")
+        try:
+            _check_version(form, supplier)
+            supplier.name = form.name.data
+            supplier.email = form.email.data
+            supplier.contact = form.contact.data
+            supplier.address = form.address.data
+            supplier.lead_time = form.lead_time.data
+            db.session.commit()
+        except StaleDataError:
+            _conflict('supplier')
+            supplier = Supplier.query.get_or_404(id)
+            # filled from the current row, not from what was posted
+            form = SupplierForm(formdata=None, obj=supplier)
+            status = 409
+        else:
+            flash('You have successfully edited the supplier.')
+
+            # redirect to the departments page
+            return redirect(url_for('home.list_suppliers'))
+
+    form.name.data = supplier.name
+    form.email.data = supplier.email
+    form.contact.data = supplier.contact
+    form.address.data = supplier.address
+    form.lead_time.data = supplier.lead_time
+    form.version.data = supplier.version
+    return render_template('home/suppliers/add.html', action="Edit",
+                           add_supplier=_add_supplier, form=form,
+                           supplier=supplier, title="Edit Supplier"), status
 
 
 @home.route('/suppliers/delete/<int:id>', methods=['GET', 'POST'])
@@ -212,7 +332,7 @@ def delete_supplier(id):
     if not current_user.is_admin:
         abort(403)
     supplier = Supplier.query.get_or_404(id)
-    db.session.delete(supplier)
+    bulk.delete_suppliers([supplier.id])
     db.session.commit()
     flash('You have successfully deleted the supplier.')
 
@@ -226,8 +346,8 @@ def list_shipments():
     """
     Render the home template on the /shipments route
     """
-    shipments = Shipment.query.all()
-    return render_template('home/shipments/list.html', shipments=shipments, title="Shipments")
+    shipments = listings.shipment_rows().yield_per(STREAM_ROWS)
+    return _stream_template('home/shipments/list.html', shipments=shipments, title="Shipments")
 
 
 @home.route('/shipments/add', methods=['GET', 'POST'])
@@ -249,20 +369,19 @@ def add_shipment():
         try:
             # add shipment to the database and update product
             product = Product.query.get_or_404(form.product.data.id)
-            product.stock -= shipment.quantity
-            transaction = Transaction(
-                product=product,
-                date=product.rcv_date,
-                quantity=-shipment.quantity
-            )
-            if product.stock < 0 or shipment.quantity <= 0:
+            if product.stock < shipment.quantity or shipment.quantity <= 0:
                 flash('Specified quantity is not correct or not available')
             else:
+                shipment.location_id = product.location_id
                 db.session.add(shipment)
-                db.session.add(transaction)
+                ledger.record(product, -shipment.quantity, shipment.shipment_date, ledger.SHIPMENT)
+                consumption.book(shipment)
                 db.session.commit()
                 flash('You have successfully added a new shipment.')
+        except StaleDataError:
+            _busy('product')
         except:
+            db.session.rollback()
             # in case shipment already exists
             flash('Error: An error occurred.')
 
@@ -285,33 +404,50 @@ def edit_shipment(id):
 
     shipment = Shipment.query.get_or_404(id)
     form = ShipmentForm(obj=shipment)
+    status = 200
     if form.validate_on_submit():
-        old_prod = Product.query.get_or_404(shipment.product.id)
-        old_prod.stock += shipment.quantity
-        shipment.department = form.department.data
-        shipment.name = form.name.data
-        shipment.quantity = form.quantity.data
-        shipment.shipment_date = form.shipment_date.data
-        shipment.product = form.product.data
-        new_prod = Product.query.get_or_404(shipment.product.id)
-        new_prod.stock -= shipment.quantity
-        if new_prod.stock < 0:
-            flash('Specified quantity is not available')
+        try:
+            # an edit of an older version would reverse and book it twice
+            _check_version(form, shipment)
+            # reverse the original shipment before booking the edited one
+            old_prod = Product.query.get_or_404(shipment.product.id)
+            ledger.record(old_prod, shipment.quantity, shipment.shipment_date, ledger.SHIPMENT_REVERSAL)
+            consumption.book(shipment, -1)
+            shipment.department = form.department.data
+            shipment.name = form.name.data
+            shipment.quantity = form.quantity.data
+            shipment.shipment_date = form.shipment_date.data
+            shipment.product = form.product.data
+            new_prod = Product.query.get_or_404(shipment.product.id)
+            if new_prod.id != old_prod.id:
+                shipment.location_id = new_prod.location_id
+            if new_prod.stock < shipment.quantity:
+                db.session.rollback()
+                flash('Specified quantity is not available')
+            else:
+                ledger.record(new_prod, -shipment.quantity, shipment.shipment_date, ledger.SHIPMENT)
+                consumption.book(shipment)
+                db.session.commit()
+                flash('You have successfully edited the shipment.')
+        except StaleDataError:
+            _conflict('shipment')
+            shipment = Shipment.query.get_or_404(id)
+            # filled from the current row, not from what was posted
+            form = ShipmentForm(formdata=None, obj=shipment)
+            status = 409
         else:
-            db.session.commit()
-            flash('You have successfully edited the shipment.')
-
-        # redirect to the departments page
-        return redirect(url_for('home.list_shipments'))
-    else:
-        form.department.data = shipment.department
-        form.name.data = shipment.name
-        form.quantity.data = shipment.quantity
-        form.shipment_date.data = shipment.shipment_date
-        form.product.data = shipment.product
-        return render_template('home/shipments/add.html', action="Edit",
-                               add_shipment=_add_shipment, form=form,
-                               shipment=shipment, title="Edit Shipment")
+            # redirect to the departments page
+            return redirect(url_for('home.list_shipments'))
+
+    form.department.data = shipment.department
+    form.name.data = shipment.name
+    form.quantity.data = shipment.quantity
+    form.shipment_date.data = shipment.shipment_date
+    form.product.data = shipment.product
+    form.version.data = shipment.version
+    return render_template('home/shipments/add.html', action="Edit",
+                           add_shipment=_add_shipment, form=form,
+                           shipment=shipment, title="Edit Shipment"), status
 
 
 @home.route('/shipments/delete/<int:id>', methods=['GET', 'POST'])
@@ -324,10 +460,14 @@ def delete_shipment(id):
         abort(403)
     shipment = Shipment.query.get_or_404(id)
     product = Product.query.get_or_404(shipment.product.id)
-    product.stock += shipment.quantity
-    db.session.delete(shipment)
-    db.session.commit()
-    flash('You have successfully deleted the shipment.')
+    try:
+        ledger.record(product, shipment.quantity, shipment.shipment_date, ledger.SHIPMENT_REVERSAL)
+        consumption.book(shipment, -1)
+        db.session.delete(shipment)
+        db.session.commit()
+        flash('You have successfully deleted the shipment.')
+    except StaleDataError:
+        _busy('product')
 
     # redirect to the departments page
     return redirect(url_for('home.list_shipments'))
@@ -338,12 +478,56 @@ def delete_shipment(id):
 def list_inventory():
     """
     Render the home template on the /inventory route
+    Pass as_of to see the inventory at the end of a past day
+    Filter with abc and xyz, pass sort=class to order by class
+    Pass location to list a single location
+    """
+    as_of = request.args.get('as_of', None)
+    location_id = request.args.get('location', None, type=int)
+    quantity = func.sum(Product.stock)
+    query = db.session.query(Product).outerjoin(Location, Location.id == Product.location_id)
+    if as_of:
+        try:
+            as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+        except ValueError:
+            abort(400)
+        try:
+            stock = ledger.stock_as_of(as_of)
+        except ValueError as exception:
+            flash(str(exception))
+            return redirect(url_for('home.list_inventory'))
+        quantity = func.sum(stock.c.stock)
+        query = query.join(stock, stock.c.product_id == Product.id)
+    if location_id is not None:
+        query = query.filter(Product.location_id == location_id)
+    query = _filter_by_class(query).with_entities(Product.name,
+                                                  label('location_id', Product.location_id),
+                                                  label('location', Location.name),
+                                                  label('Quantity', quantity),
+                                                  label('Expiry', func.min(Product.exp_date)),
+                                                  label('ABC', func.min(Product.abc_class)),
+                                                  label('XYZ', func.min(Product.xyz_class)),
+                                                  ).group_by(Product.name, Product.location_id,
+                                                             Location.name)
+    if request.args.get('sort') == 'class':
+        query = query.order_by(func.min(Product.abc_class), func.min(Product.xyz_class))
+    inventory = query.all()
+    return render_template('home/inventory/list.html', inventory=inventory, as_of=as_of,
+                           title="Inventory")
+
+
+@home.route('/locations')
+@login_required
+def list_locations():
+    """
+    Render the home template on the /locations route
     """
-    inventory = db.session.query(Product.name, Product.location,
-                         label('Quantity', func.sum(Product.stock)),
-                         label('Expiry', func.min(Product.exp_date)),
-                         ).group_by(Product.name, Product.location).all()
-    return render_template('home/inventory/list.html', inventory=inventory, title="Inventory")
+    products = db.session.query(Product.location_id, label('count', func.count(Product.id))) \
+        .group_by(Product.location_id).subquery()
+    locations = db.session.query(Location, label('products', func.coalesce(products.c.count, 0))) \
+        .outerjoin(products, products.c.location_id == Location.id) \
+        .order_by(Location.warehouse, Location.zone, Location.bin).all()
+    return render_template('home/locations/list.html', locations=locations, title="Locations")
 
 
 @home.route('/reports')
@@ -352,20 +536,310 @@ def list_reports():
     """
     Render the home template on the /reports route
     """
+    # pandas and the archive (NumPy) are only needed here, import them on
+    # first use rather than on every worker and CLI start
+    import pandas as pd
+    from .. import archive
+
     if not current_user.is_admin:
         abort(403)
     from_date = request.args.get('from_date', None)
     to_date = request.args.get('to_date', None)
     if from_date is None or to_date is None:
-        return render_template('home/reports/list.html', transactions=pd.DataFrame(), title="Report")
-    transactions = Transaction.query.filter(Transaction.date >= from_date, Transaction.date <= to_date).all()
-    if len(transactions) == 0:
-        return render_template('home/reports/list.html', transactions=pd.DataFrame(), title="Report")
-    df = pd.DataFrame.from_records(data=[t.to_dict() for t in transactions], columns=['date', 'id', 'product', 'quantity'])
+        return render_template('home/reports/list.html', transactions=[], title="Report")
+    try:
+        from_date = datetime.strptime(from_date, '%Y-%m-%d').date()
+        to_date = datetime.strptime(to_date, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400)
+    # recent transactions are in the table, older ones in the archive
+    transactions = db.session.query(Transaction.date, Transaction.product_id, Transaction.quantity) \
+        .filter(Transaction.date >= from_date, Transaction.date <= to_date,
+                ledger.is_movement(Transaction.reason)).all()
+    archived = archive.read_transactions(from_date, to_date)
+    df = pd.concat([
+        pd.DataFrame.from_records(data=transactions, columns=['date', 'product_id', 'quantity']),
+        pd.DataFrame({'date': archived['date'].astype(object),
+                      'product_id': archived['product_id'],
+                      'quantity': archived['quantity']})
+    ], ignore_index=True)
+    if len(df) == 0:
+        return render_template('home/reports/list.html', transactions=[], title="Report")
+    product_ids = [int(i) for i in df.product_id.dropna().unique()]
+    names = {}
+    for start in range(0, len(product_ids), 500):
+        names.update(db.session.query(Product.id, Product.name)
+                     .filter(Product.id.in_(product_ids[start:start + 500])).all())
+    df['product'] = df.product_id.map(names).fillna('')
     df['in'] = df[df.quantity > 0].quantity
     df['out'] = df[df.quantity < 0].quantity
     df = df.groupby(['date', 'product'])['in', 'out'].sum()
     df.reset_index(inplace=True)
 
-    return render_template('home/reports/list.html', transactions=df, title="Report")
+    return _stream_template('home/reports/list.html', title="Report",
+                            transactions=df[['date', 'product', 'in', 'out']].itertuples(index=False, name=None))
+
+
+# Request arguments filtering the consumption cube on each level
+CONSUMPTION_FILTERS = {
+    'department': 'department',
+    'month': 'month',
+    'product': 'product_id',
+    'location': 'location_id',
+}
+
+
+def _consumption_filters():
+    """
+    Read the filters of the consumption cube from the request
+    Raises ValueError for a month not given as YYYY-MM
+    """
+    filters = {}
+    if request.args.get('department'):
+        filters['department'] = request.args['department']
+    for name in ('product_id', 'location_id'):
+        if request.args.get(name):
+            filters[name] = request.args.get(name, type=int)
+    for name, keyword in (('month', 'month'), ('from', 'from_month'), ('to', 'to_month')):
+        if request.args.get(name):
+            filters[keyword] = consumption.parse_month(request.args[name])
+    return filters
+
+
+@home.route('/consumption')
+@login_required
+def list_consumption():
+    """
+    Render the home template on the /consumption route
+    Each row drills down into the next level: department, month, product
+    then location
+    """
+    try:
+        filters = _consumption_filters()
+    except ValueError:
+        flash('Months must be given as YYYY-MM.')
+        filters = {}
+    remaining = [level for level in consumption.LEVELS
+                 if request.args.get(CONSUMPTION_FILTERS[level]) is None]
+    level = remaining[0] if remaining else consumption.LEVELS[-1]
+    cells = consumption.drill([level], **filters)
+    drill = len(remaining) > 1
+    for cell in cells:
+        if level in ('product', 'location'):
+            cell['label'] = cell[level + '_name']
+        else:
+            cell['label'] = cell[level]
+        if drill and cell[level] is not None:
+            arguments = request.args.to_dict()
+            arguments[CONSUMPTION_FILTERS[level]] = cell[level]
+            cell['url'] = url_for('home.list_consumption', **arguments)
+    return render_template('home/consumption/list.html', cells=cells, level=level,
+                           filters=request.args, title="Consumption")
+
+
+@home.route('/api/consumption')
+@login_required
+def api_consumption():
+    """
+    Return the consumption summed by levels as JSON
+    by lists levels among department, month, product and location, comma
+    separated. Filter with department, month, product_id, location_id and
+    the from and to months, months given as YYYY-MM
+    """
+    levels = [level for level in request.args.get('by', 'department').split(',') if level]
+    if any(level not in consumption.LEVELS for level in levels):
+        return jsonify(error='by must be made of {}.'.format(', '.join(consumption.LEVELS))), 400
+    try:
+        filters = _consumption_filters()
+    except ValueError:
+        return jsonify(error='Months must be given as YYYY-MM.'), 400
+    return jsonify(levels=levels, cells=consumption.drill(levels, **filters))
+
+
+@home.route('/api/stock-series')
+@login_required
+def api_stock_series():
+    """
+    Return the stock of a product or a location over time as JSON, reduced
+    on the server for charting
+    Pass product_id or location_id, optionally from and to (YYYY-MM-DD),
+    buckets and method (minmax for the low, high and last level of each
+    bucket or lttb for a subset of the points)
+    """
+    product_id = request.args.get('product_id', type=int)
+    location_id = request.args.get('location_id', type=int)
+    if (product_id is None) == (location_id is None):
+        return jsonify(error='Pass one of product_id and location_id.'), 400
+    method = request.args.get('method', timeseries.METHODS[0])
+    if method not in timeseries.METHODS:
+        return jsonify(error='method must be one of {}.'.format(', '.join(timeseries.METHODS))), 400
+    buckets = request.args.get('buckets', type=int)
+    if buckets is not None and buckets < 1:
+        return jsonify(error='buckets must be positive.'), 400
+    try:
+        start, end = [datetime.strptime(request.args[name], '%Y-%m-%d').date()
+                      if request.args.get(name) else None for name in ('from', 'to')]
+    except ValueError:
+        return jsonify(error='Dates must be given as YYYY-MM-DD.'), 400
+    if product_id is not None:
+        Product.query.get_or_404(product_id)
+    else:
+        Location.query.get_or_404(location_id)
+    try:
+        series = timeseries.stock_series(product_id, location_id, start, end, buckets, method)
+    except ValueError as exception:
+        return jsonify(error=str(exception)), 400
+    return jsonify(product_id=product_id, location_id=location_id, **series)
+
 
+@home.route('/sync')
+@login_required
+def api_sync():
+    """
+    Return the products, suppliers, shipments and transactions changed
+    since a cursor, for handheld clients keeping a copy of them
+    Pass since, the cursor of the previous batch or 0 for everything, and
+    optionally limit. Fetch again with the returned cursor while more is
+    true. A cursor older than the purged tombstones is answered with 410,
+    the client drops its copy and starts again from 0.
+    """
+    limit = request.args.get('limit', current_app.config['SYNC_DEFAULT_BATCH'], type=int)
+    if limit < 1:
+        return jsonify(error='limit must be positive.'), 400
+    try:
+        feed = sync.changes_since(request.args.get('since'),
+                                  min(limit, current_app.config['SYNC_MAX_BATCH']))
+    except ValueError:
+        return jsonify(error='Invalid cursor.'), 400
+    except sync.ResyncRequired:
+        return jsonify(error='Full resync required, start again from 0.', resync=True), 410
+    return jsonify(feed)
+
+
+@home.route('/forecasts')
+@login_required
+def list_forecasts():
+    """
+    Render the home template on the /forecasts route
+    Only the forecast of the best scoring model is listed for each product
+    """
+    forecasts = db.session.query(Forecast, Product.name, Product.stock) \
+        .join(Product, Product.id == Forecast.product_id) \
+        .filter(Forecast.best.is_(True)).all()
+    return render_template('home/forecasts/list.html', forecasts=forecasts, title="Forecasts")
+
+
+@home.route('/api/forecasts')
+@login_required
+def api_forecasts():
+    """
+    Return the stored forecasts as JSON
+    Filter with product_id and best=1
+    """
+    query = Forecast.query
+    if request.args.get('product_id'):
+        product_id = request.args.get('product_id', type=int)
+        if product_id is None:
+            return jsonify(error='product_id must be an integer.'), 400
+        query = query.filter(Forecast.product_id == product_id)
+    if request.args.get('best'):
+        query = query.filter(Forecast.best.is_(True))
+    return jsonify(forecasts=[f.to_dict() for f in query.all()])
+
+
+def _parse_scan(event):
+    """
+    Turn a posted scan into (product_id, quantity, date, reason)
+    """
+    if not isinstance(event, dict) or event.get('type') not in scans.TYPES:
+        raise ValueError('type must be one of {}.'.format(', '.join(sorted(scans.TYPES))))
+    reason, sign = scans.TYPES[event['type']]
+    product_id = int(event['product_id'])
+    quantity = float(event['quantity'])
+    if quantity <= 0:
+        raise ValueError('quantity must be positive.')
+    entry_date = datetime.strptime(event['date'], '%Y-%m-%d').date() if event.get('date') \
+        else date.today()
+    return product_id, sign * quantity, entry_date, reason
+
+
+@home.route('/api/scans', methods=['POST'])
+@login_required
+def api_scans():
+    """
+    Book receipts and picks posted by the dock scanners
+    Post one event or a list of them, each with type (receipt or pick),
+    product_id, quantity and optionally date. Events from concurrent
+    requests are committed together, the response is sent once the events
+    of the request are committed.
+    """
+    payload = request.get_json(silent=True)
+    events = payload if isinstance(payload, list) else [payload]
+    try:
+        events = [_parse_scan(event) for event in events]
+    except KeyError as exception:
+        return jsonify(error='{} is required.'.format(exception.args[0])), 400
+    except (TypeError, ValueError) as exception:
+        return jsonify(error=str(exception) or 'Invalid scan.'), 400
+    futures = [scans.submit(*event) for event in events]
+    results = []
+    for future in futures:
+        try:
+            future.result(timeout=current_app.config['SCAN_ACK_TIMEOUT'])
+            results.append({'status': 'ok'})
+        except scans.ScanRejected as exception:
+            results.append({'status': 'rejected', 'error': str(exception)})
+        except TimeoutError:
+            return jsonify(error='Scans not acknowledged in time, they may still be booked.'), 503
+    if not isinstance(payload, list):
+        return jsonify(results[0]), 201 if results[0]['status'] == 'ok' else 409
+    return jsonify(results=results)
+
+
+@home.route('/purchasing')
+@login_required
+def list_purchasing():
+    """
+    Render the home template on the /purchasing route
+    List the products to order, grouped per supplier
+    """
+    orders = db.session.query(ReorderPoint, Product.name, Product.stock, Supplier.name) \
+        .join(Product, Product.id == ReorderPoint.product_id) \
+        .outerjoin(Supplier, Supplier.id == ReorderPoint.supplier_id) \
+        .filter(ReorderPoint.order_quantity > 0) \
+        .order_by(Supplier.name, ReorderPoint.supplier_id, Product.name).all()
+    # grouped on the id, suppliers may share a name
+    suppliers = []
+    for _, rows in groupby(orders, key=lambda order: order[0].supplier_id):
+        rows = list(rows)
+        suppliers.append((rows[0][3], rows))
+    return render_template('home/purchasing/list.html', suppliers=suppliers, title="Purchasing")
+
+
+@home.route('/search')
+@login_required
+def search_catalogue():
+    """
+    Render the home template on the /search route
+    Search products and suppliers for the words in q
+    """
+    terms = request.args.get('q', '')
+    return render_template('home/search/list.html', terms=terms,
+                           products=search.search_products(terms),
+                           suppliers=search.search_suppliers(terms),
+                           title="Search")
+
+
+@home.route('/api/search')
+@login_required
+def api_search():
+    """
+    Return the products and suppliers matching q as JSON
+    """
+    terms = request.args.get('q', '')
+    limit = request.args.get('limit', 50, type=int)
+    if limit < 1:
+        return jsonify(error='limit must be positive.'), 400
+    limit = min(limit, 500)
+    return jsonify(products=[dict(p.items()) for p in search.search_products(terms, limit)],
+                   suppliers=[dict(s.items()) for s in search.search_suppliers(terms, limit)])
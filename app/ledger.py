@@ -0,0 +1,114 @@
+# app/ledger.py
+
+from datetime import date
+
+from sqlalchemy import and_, func, or_
+
+from app import db, locations
+from app.models import Product, StockSnapshot, Transaction
+
+
+# Reasons recorded on ledger entries
+RECEIPT = 'receipt'
+ADJUSTMENT = 'adjustment'
+SHIPMENT = 'shipment'
+SHIPMENT_REVERSAL = 'shipment_reversal'
+# Picks scanned on the dock, see app/scans.py
+PICK = 'pick'
+# Sum of the transactions moved to the archive, see app/archive.py
+OPENING_BALANCE = 'opening_balance'
+
+# Reasons of the entries that consumed stock, net of reversals
+CONSUMPTION = (SHIPMENT, SHIPMENT_REVERSAL, PICK)
+
+
+def is_movement(reason):
+    """
+    Match the entries that moved stock, leaving out opening balances
+    """
+    return or_(reason.is_(None), reason != OPENING_BALANCE)
+
+
+def record(product, quantity, entry_date, reason):
+    """
+    Change the stock of a product and write the matching ledger entry
+
+    Every stock change goes through here so that the transactions of a
+    product always add up to its stock. Snapshots taken on or after a
+    back-dated entry no longer hold and are dropped, the next snapshot job
+    rebuilds them. The stock of the product's location moves along.
+    """
+    product.stock = (product.stock or 0) + quantity
+    locations.adjust(product.location_id, quantity)
+    transaction = Transaction(product=product,
+                              date=entry_date,
+                              quantity=quantity,
+                              reason=reason)
+    db.session.add(transaction)
+    if product.id is not None:
+        StockSnapshot.query.filter(StockSnapshot.product_id == product.id,
+                                   StockSnapshot.date >= entry_date) \
+            .delete(synchronize_session=False)
+    return transaction
+
+
+def opening_date():
+    """
+    Return the day of the opening balances left by the archive, or None
+
+    The transactions up to that day are in the archive, the stock at the
+    end of an earlier day can no longer be read from the database.
+    """
+    return db.session.query(func.max(Transaction.date)) \
+        .filter(Transaction.reason == OPENING_BALANCE).scalar()
+
+
+def stock_as_of(as_of):
+    """
+    Build a subquery with the stock of every product at the end of a day
+
+    The stock is read from the latest snapshot on or before the date and
+    only the transactions recorded after that snapshot are summed on top.
+    Raises ValueError for a day before the archive's opening balances.
+    """
+    opened = opening_date()
+    if opened is not None and as_of < opened:
+        raise ValueError('Stock before {} is archived.'.format(opened.isoformat()))
+    latest = db.session.query(StockSnapshot.product_id,
+                              func.max(StockSnapshot.date).label('date')) \
+        .filter(StockSnapshot.date <= as_of) \
+        .group_by(StockSnapshot.product_id).subquery()
+    snapshot = db.session.query(StockSnapshot.product_id,
+                                StockSnapshot.date,
+                                StockSnapshot.stock) \
+        .join(latest, and_(StockSnapshot.product_id == latest.c.product_id,
+                           StockSnapshot.date == latest.c.date)).subquery()
+    delta = db.session.query(Transaction.product_id,
+                             func.sum(Transaction.quantity).label('quantity')) \
+        .outerjoin(snapshot, snapshot.c.product_id == Transaction.product_id) \
+        .filter(Transaction.date <= as_of,
+                or_(snapshot.c.date.is_(None), Transaction.date > snapshot.c.date)) \
+        .group_by(Transaction.product_id).subquery()
+    stock = func.coalesce(snapshot.c.stock, 0) + func.coalesce(delta.c.quantity, 0)
+    return db.session.query(Product.id.label('product_id'),
+                            stock.label('stock')) \
+        .outerjoin(snapshot, snapshot.c.product_id == Product.id) \
+        .outerjoin(delta, delta.c.product_id == Product.id).subquery()
+
+
+def take_snapshot(as_of=None):
+    """
+    Checkpoint the stock of every product at the end of a day
+
+    Returns the number of snapshots written.
+    """
+    as_of = as_of or date.today()
+    rows = db.session.query(stock_as_of(as_of)).all()
+    StockSnapshot.query.filter(StockSnapshot.date == as_of) \
+        .delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(StockSnapshot, [
+        {'product_id': product_id, 'date': as_of, 'stock': stock}
+        for product_id, stock in rows
+    ])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,35 @@
+# app/listings.py
+
+from sqlalchemy.sql import label
+
+from app import db
+from app.models import Product, Shipment, Supplier
+
+
+# Read-only listings select only the columns their pages print. Rows come
+# back as plain named tuples, with no ORM instances or identity map to fill.
+
+def product_rows():
+    """
+    Query the columns of the product listing
+    """
+    return db.session.query(Product.id, Product.name, Product.location, Product.stock,
+                            Product.rcv_date, Product.exp_date, Product.abc_class,
+                            Product.xyz_class)
+
+
+def supplier_rows():
+    """
+    Query the columns of the supplier listing
+    """
+    return db.session.query(Supplier.id, Supplier.name, Supplier.email, Supplier.contact,
+                            Supplier.address)
+
+
+def shipment_rows():
+    """
+    Query the columns of the shipment listing
+    """
+    return db.session.query(Shipment.id, Shipment.department, Shipment.name, Shipment.quantity,
+                            Shipment.shipment_date, label('product_name', Product.name)) \
+        .outerjoin(Product, Product.id == Shipment.product_id)
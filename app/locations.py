@@ -0,0 +1,82 @@
+# app/locations.py
+
+import re
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Location, Product
+
+
+SEPARATORS = re.compile(r'\s*[/,>|]\s*')
+
+
+def parse(text):
+    """
+    Split a location as typed into its warehouse, zone and bin
+
+    Parts are read from the right, "Main / A / 12" is warehouse Main, zone A,
+    bin 12 and a lone "12" is bin 12 of the default warehouse.
+    """
+    text = ' '.join(text.split())
+    parts = [part for part in SEPARATORS.split(text) if part][-3:]
+    parts = [''] * (3 - len(parts)) + parts
+    if not parts[0]:
+        parts[0] = current_app.config['LOCATION_DEFAULT_WAREHOUSE']
+    return parts[0], parts[1], parts[2], text
+
+
+def normalize(warehouse, zone, bin):
+    """
+    Build the key that every spelling of a location shares
+    """
+    return '/'.join(part.lower() for part in (warehouse, zone, bin))
+
+
+def resolve(text):
+    """
+    Return the location of a location as typed, created on first use
+    """
+    warehouse, zone, bin, name = parse(text)
+    key = normalize(warehouse, zone, bin)
+    location = Location.query.filter_by(key=key).first()
+    if location is None:
+        location = Location(warehouse=warehouse, zone=zone, bin=bin, name=name, key=key, stock=0)
+        db.session.add(location)
+        db.session.flush()
+    return location
+
+
+def adjust(location_id, quantity):
+    """
+    Add to the stock aggregate of a location, in the current transaction
+    """
+    if location_id is not None and quantity:
+        db.session.execute(Location.__table__.update()
+                           .where(Location.id == location_id)
+                           .values(stock=Location.stock + quantity))
+
+
+def place(product, text):
+    """
+    Put a product at a location as typed, moving its stock along
+    """
+    location = resolve(text)
+    if location.id != product.location_id:
+        adjust(product.location_id, -(product.stock or 0))
+        adjust(location.id, product.stock or 0)
+        product.location_id = location.id
+    product.location = location.name
+    return location
+
+
+def rebuild():
+    """
+    Recompute the stock aggregate of every location from its products
+    """
+    stock = select([func.coalesce(func.sum(Product.stock), 0)]) \
+        .where(Product.location_id == Location.id).as_scalar()
+    count = db.session.execute(Location.__table__.update().values(stock=stock)).rowcount
+    db.session.commit()
+    return count
@@ -1,9 +1,9 @@
 # app/models.py
 
+from flask import current_app
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 
-from app import db, login_manager
+from app import db, login_manager, passwords, tenants
 
 
 class Employee(UserMixin, db.Model):
@@ -38,13 +38,18 @@ class Employee(UserMixin, db.Model):
         """
         Set password to a hashed password
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def verify_password(self, password):
         """
         Check if hashed password matches actual password
+        Rehash it when the hashing parameters have changed since it was set
         """
-        return check_password_hash(self.password_hash, password)
+        if not passwords.verify_password(self.password_hash, password):
+            return False
+        if passwords.needs_rehash(self.password_hash):
+            self.password = password
+        return True
 
     def __repr__(self):
         return '<Employee: {}>'.format(self.username)
@@ -53,6 +58,11 @@ class Employee(UserMixin, db.Model):
 # Set up user_loader
 @login_manager.user_loader
 def load_user(user_id):
+    if not tenants.owns_session():
+        return None
+    if current_app.config['SESSION_BACKEND'] is not None:
+        from app.sessions import load_employee
+        return load_employee(int(user_id))
     return Employee.query.get(int(user_id))
 
 
@@ -61,22 +71,59 @@ class Product(db.Model):
     Create a Product table
     """
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_abc_class_xyz_class', 'abc_class', 'xyz_class'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(60))
     mfg_date = db.Column(db.Date)
     exp_date = db.Column(db.Date)
     rcv_date = db.Column(db.Date)
+    # location as entered, the normalized one is location_id
     location = db.Column(db.String(100))
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
     stock = db.Column(db.Float)
+    # ABC (volume) and XYZ (variability) classes, see app/classification.py
+    abc_class = db.Column(db.String(1))
+    xyz_class = db.Column(db.String(1), index=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'))
+    # bumped on every update, an update of an older version is refused
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     shipments = db.relationship('Shipment', backref='product', lazy='dynamic')
     transactions = db.relationship('Transaction', backref='product', lazy='dynamic')
+    forecasts = db.relationship('Forecast', backref='product', lazy='dynamic')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return '<Product: {}>'.format(self.name)
 
 
+class Location(db.Model):
+    """
+    Create a Location table
+
+    A bin in a zone of a warehouse. Spellings of the same place share one
+    row through the normalized key, and stock holds the summed stock of its
+    products, see app/locations.py.
+    """
+
+    __tablename__ = 'locations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    warehouse = db.Column(db.String(60))
+    zone = db.Column(db.String(60))
+    bin = db.Column(db.String(60))
+    name = db.Column(db.String(100))
+    key = db.Column(db.String(200), unique=True)
+    stock = db.Column(db.Float, default=0)
+    products = db.relationship('Product', backref='place', lazy='dynamic')
+
+    def __repr__(self):
+        return '<Location: {}>'.format(self.name)
+
+
 class Supplier(db.Model):
     """
     Create a Supplier table
@@ -89,8 +136,12 @@ class Supplier(db.Model):
     email = db.Column(db.String(60), index=True, unique=True)
     contact = db.Column(db.String(50))
     address = db.Column(db.String(100))
+    lead_time = db.Column(db.Integer)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
     products = db.relationship('Product', backref='supplier', lazy='dynamic')
 
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return '<Supplier: {}>'.format(self.name)
 
@@ -108,6 +159,11 @@ class Shipment(db.Model):
     quantity = db.Column(db.Float)
     shipment_date = db.Column(db.Date)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
+    # where the product was taken from when the shipment was booked
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return '<Shipment: {} units of {} sent to {} from {} on {}>'.format(self.quantity,
@@ -117,6 +173,37 @@ class Shipment(db.Model):
                                                                             self.shipment_date)
 
 
+class ConsumptionCell(db.Model):
+    """
+    Create a ConsumptionCell table
+
+    One cell of the consumption cube: the quantity and number of shipments
+    of a product sent from a location to a department in a month. Cells
+    are kept up to date as shipments change, see app/consumption.py.
+    """
+
+    __tablename__ = 'consumption_cube'
+    __table_args__ = (
+        db.UniqueConstraint('month', 'department', 'product_id', 'location_id'),
+        db.Index('ix_consumption_cube_department_month', 'department', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # first day of the month
+    month = db.Column(db.Date)
+    department = db.Column(db.String(60))
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
+    quantity = db.Column(db.Float, default=0)
+    shipments = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return '<ConsumptionCell: {} units of {} to {} in {}>'.format(self.quantity,
+                                                                    self.product_id,
+                                                                    self.department,
+                                                                    self.month)
+
+
 class Transaction(db.Model):
     """
     Create a Transaction table
@@ -124,9 +211,14 @@ class Transaction(db.Model):
 
     __tablename__ = 'transactions'
 
+    __table_args__ = (
+        db.Index('ix_transactions_product_id_date', 'product_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Float)
-    date = db.Column(db.Date)
+    date = db.Column(db.Date, index=True)
+    reason = db.Column(db.String(20))
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
 
     def to_dict(self):
@@ -134,9 +226,179 @@ class Transaction(db.Model):
             'id': self.id,
             'date': self.date,
             'product': self.product.name,
-            'quantity': self.quantity
+            'quantity': self.quantity,
+            'reason': self.reason
         }
 
     def __repr__(self):
         return '<Transaction: {} units of {} sent/received>'.format(self.quantity,
                                                                     self.product_id)
+
+
+class StockSnapshot(db.Model):
+    """
+    Create a StockSnapshot table
+
+    Each row checkpoints the stock of one product at the end of a day, so the
+    stock at any date can be rebuilt from the nearest earlier snapshot plus
+    the transactions recorded after it.
+    """
+
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date)
+    stock = db.Column(db.Float)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
+
+    def __repr__(self):
+        return '<StockSnapshot: {} units of {} on {}>'.format(self.stock,
+                                                             self.product_id,
+                                                             self.date)
+
+
+class Forecast(db.Model):
+    """
+    Create a Forecast table
+
+    Holds the latest demand forecast of each model for each product.
+    """
+
+    __tablename__ = 'forecasts'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'model'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    model = db.Column(db.String(30))
+    generated_on = db.Column(db.Date)
+    horizon = db.Column(db.Integer)
+    quantity = db.Column(db.Float)
+    error = db.Column(db.Float)
+    best = db.Column(db.Boolean, default=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
+
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'model': self.model,
+            'generated_on': self.generated_on.isoformat(),
+            'horizon': self.horizon,
+            'quantity': self.quantity,
+            'error': self.error,
+            'best': self.best
+        }
+
+    def __repr__(self):
+        return '<Forecast: {} units of {} in {} days ({})>'.format(self.quantity,
+                                                                 self.product_id,
+                                                                 self.horizon,
+                                                                 self.model)
+
+
+class ReorderPoint(db.Model):
+    """
+    Create a ReorderPoint table
+
+    Holds the latest safety stock, reorder point and suggested order
+    quantity of each product.
+    """
+
+    __tablename__ = 'reorder_points'
+
+    id = db.Column(db.Integer, primary_key=True)
+    demand_mean = db.Column(db.Float)
+    demand_deviation = db.Column(db.Float)
+    safety_stock = db.Column(db.Float)
+    reorder_point = db.Column(db.Float)
+    order_quantity = db.Column(db.Float, index=True)
+    computed_on = db.Column(db.Date)
+    # last transaction seen when the row was computed
+    transaction_id = db.Column(db.Integer)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), unique=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'))
+
+    def __repr__(self):
+        return '<ReorderPoint: order {} units of {} below {}>'.format(self.order_quantity,
+                                                                     self.product_id,
+                                                                     self.reorder_point)
+
+
+class KpiSnapshot(db.Model):
+    """
+    Create a KpiSnapshot table
+
+    Holds the precomputed KPIs of the dashboard as JSON, one row per KPI,
+    see app/dashboard.py.
+    """
+
+    __tablename__ = 'kpi_snapshot'
+
+    name = db.Column(db.String(40), primary_key=True)
+    value = db.Column(db.Text)
+    computed_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<KpiSnapshot: {} at {}>'.format(self.name, self.computed_at)
+
+
+class Change(db.Model):
+    """
+    Create a Change table
+
+    The latest change of each synced row: the version of the transaction
+    that last wrote it and whether that was a delete. Clients catch up by
+    reading the changes above the last version they saw, see app/sync.py.
+    """
+
+    __tablename__ = 'changes'
+    __table_args__ = (
+        db.Index('ix_changes_version', 'version', 'table_name', 'row_id'),
+    )
+
+    table_name = db.Column(db.String(30), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer)
+    deleted = db.Column(db.Boolean, default=False)
+
+    def __repr__(self):
+        return '<Change: {} {} at {}>'.format(self.table_name, self.row_id, self.version)
+
+
+class SyncCounter(db.Model):
+    """
+    Create a SyncCounter table
+
+    Holds the last change version handed out, in its only row, and the
+    oldest version a client may resume from once tombstones were purged.
+    """
+
+    __tablename__ = 'sync_counter'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer)
+    purged = db.Column(db.Integer, nullable=False, server_default='0')
+
+    def __repr__(self):
+        return '<SyncCounter: {}>'.format(self.version)
+
+
+class LoginSession(db.Model):
+    """
+    Create a LoginSession table
+
+    Holds the server-side sessions, the cookie only carries their id.
+    """
+
+    __tablename__ = 'sessions'
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text)
+    expires_at = db.Column(db.DateTime, index=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), index=True)
+
+    def __repr__(self):
+        return '<LoginSession: of {} until {}>'.format(self.employee_id, self.expires_at)
@@ -0,0 +1,78 @@
+# app/passwords.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """
+    Raised when too many passwords are being hashed to wait for a worker
+    """
+
+
+def _pool():
+    """
+    Return the executor of the current app and the semaphore capping the
+    hashes running or waiting in it, created on first use
+    """
+    pool = current_app.extensions.get('passwords')
+    if pool is None:
+        with _lock:
+            pool = current_app.extensions.get('passwords')
+            if pool is None:
+                config = current_app.config
+                pool = (ThreadPoolExecutor(config['PASSWORD_HASH_WORKERS'],
+                                           thread_name_prefix='passwords'),
+                        threading.BoundedSemaphore(config['PASSWORD_HASH_WORKERS'] +
+                                                   config['PASSWORD_HASH_QUEUE']))
+                current_app.extensions['passwords'] = pool
+    return pool
+
+
+def _offload(function, *args):
+    """
+    Run a hashing function in the executor and wait for its result
+
+    The request thread blocks either way, but at most PASSWORD_HASH_WORKERS
+    hashes burn CPU at once, and past the queue a login fails fast with
+    HashingBusy instead of piling up.
+    """
+    executor, slots = _pool()
+    if not slots.acquire(timeout=current_app.config['PASSWORD_HASH_TIMEOUT']):
+        raise HashingBusy()
+    try:
+        return executor.submit(function, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    """
+    Hash a password with the configured method and salt length
+    """
+    config = current_app.config
+    return _offload(generate_password_hash, password, config['PASSWORD_HASH_METHOD'],
+                    config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(password_hash, password):
+    """
+    Check a password against its hash
+    """
+    return _offload(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """
+    Tell whether a hash was made with other parameters than configured
+    """
+    config = current_app.config
+    method, _, rest = password_hash.partition('$')
+    salt = rest.partition('$')[0]
+    return method != config['PASSWORD_HASH_METHOD'] or len(salt) != config['PASSWORD_SALT_LENGTH']
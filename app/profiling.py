@@ -0,0 +1,169 @@
+# app/profiling.py
+
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+
+# Profilers that can be asked for, the first is the default
+MODES = ('cprofile', 'sampling')
+
+# Files written for a profile, by mode
+EXTENSIONS = {'cprofile': '.prof', 'sampling': '.collapsed'}
+
+
+class Sampler(object):
+    """
+    Sample the stack of one thread at a fixed interval
+
+    The samples are kept as collapsed stacks, outermost frame first, the
+    format flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}:{}'.format(os.path.basename(code.co_filename), code.co_name,
+                                               frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.items():
+                output.write('{} {}\n'.format(stack, count))
+
+
+def _directory():
+    return os.path.join(current_app.instance_path, current_app.config['PROFILE_DIR'])
+
+
+def _requested_mode():
+    """
+    Return the profiler an admin asked for with the header or the query
+    parameter, or the one of a sampled request, or None
+    """
+    config = current_app.config
+    mode = request.headers.get(config['PROFILE_HEADER']) or request.args.get(config['PROFILE_PARAM'])
+    if mode is not None:
+        if not (current_user.is_authenticated and current_user.is_admin):
+            return None
+        return mode if mode in MODES else MODES[0]
+    if config['PROFILE_SAMPLE_RATE'] and random.random() < config['PROFILE_SAMPLE_RATE']:
+        return config['PROFILE_SAMPLE_MODE']
+    return None
+
+
+def _start():
+    mode = _requested_mode()
+    if mode is None:
+        return
+    if mode == 'sampling':
+        profiler = Sampler(threading.get_ident(), current_app.config['PROFILE_INTERVAL_MS'] / 1000.0)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except (RuntimeError, ValueError):
+            # another request of this process holds the profiler
+            return
+    name = '{}-{}'.format(datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'),
+                          (request.endpoint or 'unknown').replace('.', '-'))
+    g.profile = (mode, profiler, name, time.perf_counter())
+
+
+def _name_response(response):
+    profile = g.get('profile')
+    if profile is not None:
+        response.headers['X-Profile-File'] = profile[2] + EXTENSIONS[profile[0]]
+    return response
+
+
+def _finish(exception=None):
+    """
+    Stop the profiler of the request and write its file
+
+    Runs at teardown, after a streamed response has been sent in full.
+    """
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    mode, profiler, name, start = profile
+    if mode == 'sampling':
+        profiler.stop()
+    else:
+        profiler.disable()
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + EXTENSIONS[mode])
+    if mode == 'sampling':
+        profiler.dump(path)
+    else:
+        profiler.dump_stats(path)
+    current_app.logger.info('Profiled %s in %.0fms to %s', request.path,
+                            (time.perf_counter() - start) * 1000, path)
+    _rotate(directory, current_app.config['PROFILE_KEEP'])
+
+
+def _rotate(directory, keep):
+    """
+    Delete the oldest profiles past the number kept
+    """
+    names = sorted(name for name in os.listdir(directory) if name.endswith(tuple(EXTENSIONS.values())))
+    for name in names[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """
+    Return the name, size and modification time of the stored profiles,
+    newest first
+    """
+    directory = _directory()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith(tuple(EXTENSIONS.values())):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append((name, stat.st_size, datetime.fromtimestamp(stat.st_mtime)))
+    return profiles
+
+
+def init_app(app):
+    # nothing is hooked in unless profiling is switched on
+    if not app.config['PROFILE_ENABLED']:
+        return
+    app.before_request(_start)
+    app.after_request(_name_response)
+    app.teardown_request(_finish)
@@ -0,0 +1,91 @@
+# app/reconcile.py
+
+from datetime import date
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app import db, ledger, sync
+from app.models import Product, StockSnapshot, Transaction
+
+
+def _pad(array, size):
+    return np.concatenate([array, np.zeros(size - len(array), dtype=array.dtype)])
+
+
+def _sum_by_product(statement, chunk_size):
+    """
+    Stream (product_id, quantity) rows and sum them per product id
+
+    Rows are fetched chunk_size at a time and folded into an array indexed
+    by product id, so memory grows with the number of products and not with
+    the number of rows.
+    """
+    totals = np.zeros(0)
+    counts = np.zeros(0, dtype=np.int64)
+    result = db.session.connection().execution_options(stream_results=True) \
+        .execute(statement)
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = np.fromiter(chain.from_iterable(rows), dtype=np.float64,
+                            count=2 * len(rows)).reshape(-1, 2)
+        ids = chunk[:, 0].astype(np.int64)
+        sums = np.bincount(ids, weights=chunk[:, 1])
+        if len(sums) > len(totals):
+            totals, counts = _pad(totals, len(sums)), _pad(counts, len(sums))
+        totals[:len(sums)] += sums
+        counts[:len(sums)] += np.bincount(ids)
+    result.close()
+    return totals, counts
+
+
+def find_discrepancies(chunk_size=100000, tolerance=1e-6):
+    """
+    Compare the stock of every product with the sum of its transactions
+
+    Returns a list of (product_id, name, stock, ledger) tuples for the
+    products whose stock does not match the ledger.
+    """
+    stock, exists = _sum_by_product(
+        select([Product.id, func.coalesce(Product.stock, 0)]), chunk_size)
+    balance, _ = _sum_by_product(
+        select([Transaction.product_id, func.coalesce(Transaction.quantity, 0)])
+        .where(Transaction.product_id.isnot(None)), chunk_size)
+
+    size = max(len(stock), len(balance))
+    stock, exists, balance = _pad(stock, size), _pad(exists, size), _pad(balance, size)
+    # transactions of products that no longer exist are left out
+    ids = np.nonzero((exists > 0) & (np.abs(stock - balance) > tolerance))[0]
+
+    names = {}
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500].tolist()
+        names.update(db.session.query(Product.id, Product.name)
+                     .filter(Product.id.in_(batch)).all())
+    return [(int(i), names.get(int(i)), float(stock[i]), float(balance[i])) for i in ids]
+
+
+def write_adjustments(discrepancies, entry_date=None):
+    """
+    Write the ledger entries that bring the ledger in line with the stock
+
+    Products keep their stock, only the missing transactions are added.
+    """
+    entry_date = entry_date or date.today()
+    inserted_after = sync.last_id(Transaction)
+    db.session.bulk_insert_mappings(Transaction, [
+        {'product_id': product_id, 'date': entry_date,
+         'quantity': stock - balance, 'reason': ledger.ADJUSTMENT}
+        for product_id, _, stock, balance in discrepancies
+    ])
+    sync.touch(Transaction, Transaction.id > inserted_after)
+    ids = [product_id for product_id, _, _, _ in discrepancies]
+    for start in range(0, len(ids), 500):
+        StockSnapshot.query.filter(StockSnapshot.product_id.in_(ids[start:start + 500]),
+                                   StockSnapshot.date >= entry_date) \
+            .delete(synchronize_session=False)
+    db.session.commit()
+    return len(discrepancies)
@@ -0,0 +1,96 @@
+# app/reorder.py
+
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, or_, select
+
+from app import db
+from app.forecast import consumption_matrix
+from app.models import Product, ReorderPoint, Supplier, Transaction
+
+
+def _products(full, watermark):
+    """
+    Select the products whose reorder point has to be recomputed
+
+    A full refresh takes every product, otherwise only the products with
+    transactions after the watermark or without a reorder point yet.
+    """
+    query = select([Product.id, Product.stock, Product.supplier_id, Supplier.lead_time]) \
+        .select_from(Product.__table__.outerjoin(Supplier.__table__,
+                                                 Supplier.id == Product.supplier_id)) \
+        .order_by(Product.id)
+    if not full:
+        changed = select([Transaction.product_id]).where(Transaction.id > watermark)
+        computed = select([ReorderPoint.product_id])
+        query = query.where(or_(Product.id.in_(changed), ~Product.id.in_(computed)))
+    return query
+
+
+def refresh_reorder_points(full=False, today=None):
+    """
+    Compute safety stock, reorder point and order quantity of products
+
+    Demand mean and deviation come from the daily consumption over the
+    history window. With a lead time of L days and a service factor z:
+
+        safety stock  = z * deviation * sqrt(L)
+        reorder point = mean * L + safety stock
+
+    Products at or below their reorder point get an order quantity that
+    brings them back to the reorder point plus the cover days of demand.
+    Returns the number of products computed.
+    """
+    config = current_app.config
+    today = today or date.today()
+    watermark = db.session.query(func.max(ReorderPoint.transaction_id)).scalar() or 0
+    last_transaction = db.session.query(func.max(Transaction.id)).scalar() or 0
+
+    query = _products(full, watermark)
+    rows = db.session.execute(query).fetchall()
+    if not rows:
+        return 0
+    product_ids, stock, supplier_ids, lead_time = zip(*rows)
+    product_ids = np.array(product_ids, dtype=np.int64)
+    stock = np.array([s or 0 for s in stock], dtype=np.float64)
+    lead_time = np.array([config['REORDER_LEAD_TIME_DAYS'] if days is None else days
+                          for days in lead_time], dtype=np.float64)
+
+    start = today - timedelta(days=config['REORDER_HISTORY_DAYS'])
+    consumed_ids, consumed = consumption_matrix(start, today - timedelta(days=1),
+                                                query.with_only_columns([Product.id]).order_by(None))
+    demand = np.zeros((len(product_ids), consumed.shape[1]), dtype=np.float64)
+    demand[np.searchsorted(product_ids, consumed_ids)] = consumed
+
+    mean = demand.mean(axis=1)
+    deviation = demand.std(axis=1, ddof=1) if demand.shape[1] > 1 else np.zeros(len(mean))
+    safety_stock = config['REORDER_SERVICE_FACTOR'] * deviation * np.sqrt(lead_time)
+    reorder_point = mean * lead_time + safety_stock
+    target = reorder_point + mean * config['REORDER_COVER_DAYS']
+    order_quantity = np.where(stock <= reorder_point,
+                              np.ceil(np.maximum(target - stock, 0)), 0)
+
+    if full:
+        ReorderPoint.query.delete(synchronize_session=False)
+    else:
+        ReorderPoint.query.filter(ReorderPoint.product_id.in_(
+            select([Transaction.product_id]).where(Transaction.id > watermark))) \
+            .delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(ReorderPoint, [
+        {'product_id': product_id,
+         'supplier_id': supplier_id,
+         'demand_mean': demand_mean,
+         'demand_deviation': demand_deviation,
+         'safety_stock': safety,
+         'reorder_point': point,
+         'order_quantity': quantity,
+         'computed_on': today,
+         'transaction_id': last_transaction}
+        for product_id, supplier_id, demand_mean, demand_deviation, safety, point, quantity
+        in zip(product_ids.tolist(), supplier_ids, mean.tolist(), deviation.tolist(),
+               safety_stock.tolist(), reorder_point.tolist(), order_quantity.tolist())
+    ])
+    db.session.commit()
+    return len(product_ids)
@@ -0,0 +1,175 @@
+# app/scans.py
+
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from flask import current_app
+from sqlalchemy import bindparam, func
+
+from app import dashboard, db, ledger, sync, tenants
+from app.models import Location, Product, StockSnapshot, Transaction
+
+
+# Scan types -> ledger reason and sign of the quantity they book
+TYPES = {
+    'receipt': (ledger.RECEIPT, 1),
+    'pick': (ledger.PICK, -1),
+}
+
+_lock = threading.Lock()
+
+
+class ScanRejected(Exception):
+    """
+    Raised for a scan that cannot be booked, the rest of its batch still is
+    """
+
+
+def apply(events):
+    """
+    Book scan events in the current transaction with set-based statements
+
+    events are (product_id, quantity, date, reason) with the quantity
+    already signed. Events are checked in order against the running stock
+    of their product. Returns None for each booked event and a ScanRejected
+    for each refused one, the caller commits.
+    """
+    product_ids = set(event[0] for event in events)
+    products = {row.id: [row.stock or 0, row.location_id] for row in db.session.query(
+        Product.id, Product.stock, Product.location_id).filter(Product.id.in_(product_ids))}
+
+    results = []
+    transactions = []
+    products_delta = defaultdict(float)
+    locations_delta = defaultdict(float)
+    earliest = {}
+    for product_id, quantity, entry_date, reason in events:
+        product = products.get(product_id)
+        if product is None:
+            results.append(ScanRejected('Unknown product {}.'.format(product_id)))
+            continue
+        if product[0] + quantity < 0:
+            results.append(ScanRejected('Insufficient stock of product {}.'.format(product_id)))
+            continue
+        product[0] += quantity
+        products_delta[product_id] += quantity
+        if product[1] is not None:
+            locations_delta[product[1]] += quantity
+        earliest[product_id] = min(entry_date, earliest.get(product_id, entry_date))
+        transactions.append({'product_id': product_id, 'date': entry_date,
+                             'quantity': quantity, 'reason': reason})
+        results.append(None)
+
+    if transactions:
+        db.session.execute(Product.__table__.update()
+                           .where(Product.id == bindparam('b_id'))
+                           .values(stock=func.coalesce(Product.stock, 0) + bindparam('b_delta'),
+                                   version=Product.version + 1),
+                           [{'b_id': key, 'b_delta': delta} for key, delta in products_delta.items()])
+        if locations_delta:
+            db.session.execute(Location.__table__.update()
+                               .where(Location.id == bindparam('b_id'))
+                               .values(stock=Location.stock + bindparam('b_delta')),
+                               [{'b_id': key, 'b_delta': delta}
+                                for key, delta in locations_delta.items()])
+        inserted_after = sync.last_id(Transaction)
+        db.session.execute(Transaction.__table__.insert(), transactions)
+        db.session.execute(StockSnapshot.__table__.delete()
+                           .where(StockSnapshot.product_id == bindparam('b_id'))
+                           .where(StockSnapshot.date >= bindparam('b_date')),
+                           [{'b_id': key, 'b_date': day} for key, day in earliest.items()])
+        sync.touch(Product, Product.id.in_(list(products_delta)))
+        sync.touch(Transaction, Transaction.id > inserted_after)
+        dashboard.mark_stale()
+    return results
+
+
+class GroupCommitter(object):
+    """
+    Collect scan events from request threads and book them in batches
+
+    A batch closes SCAN_MAX_DELAY_MS after its first event or once it holds
+    SCAN_BATCH_SIZE events, then goes to the database in one transaction
+    and one commit, and every caller waiting on it is answered. Each
+    tenant has its own committer.
+    """
+
+    def __init__(self, app, tenant=None):
+        self.app = app
+        self.tenant = tenant
+        self.max_delay = app.config['SCAN_MAX_DELAY_MS'] / 1000.0
+        self.batch_size = app.config['SCAN_BATCH_SIZE']
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, product_id, quantity, entry_date, reason):
+        """
+        Queue an event, returns a future resolved once it is committed
+        """
+        self._start()
+        future = Future()
+        self._queue.put(((product_id, quantity, entry_date, reason), future))
+        return future
+
+    def pending(self):
+        """
+        Return the number of events waiting for a batch
+        """
+        return self._queue.qsize()
+
+    def _start(self):
+        # started on first use, so that each worker process gets its own
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='scans', daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self.app.app_context():
+                tenants.switch(self.tenant)
+                try:
+                    results = apply([event for event, _ in batch])
+                    db.session.commit()
+                except Exception as exception:
+                    db.session.rollback()
+                    results = [exception] * len(batch)
+                finally:
+                    db.session.remove()
+            for (_, future), result in zip(batch, results):
+                if result is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(result)
+
+
+def submit(product_id, quantity, entry_date, reason):
+    """
+    Queue a scan event with the group committer of the current tenant
+    """
+    tenant = tenants.current()
+    committer = current_app.extensions.get('scans', {}).get(tenant)
+    if committer is None:
+        with _lock:
+            committer = current_app.extensions.setdefault('scans', {}).setdefault(
+                tenant, GroupCommitter(current_app._get_current_object(), tenant))
+    return committer.submit(product_id, quantity, entry_date, reason)
@@ -0,0 +1,59 @@
+# app/search.py
+
+import re
+
+from sqlalchemy import or_, text
+
+from app import db
+from app.models import Product, Supplier
+
+
+def _match_query(terms):
+    """
+    Turn free text into an FTS5 query matching every word as a prefix
+    """
+    words = re.findall(r'\w+', terms)
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def _use_fts():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def search_products(terms, limit=50):
+    """
+    Find products by name or location, best matches first
+    """
+    match = _match_query(terms)
+    if not match:
+        return []
+    if _use_fts():
+        return db.session.execute(text(
+            'SELECT products.id, products.name, products.location, products.stock '
+            'FROM products_fts JOIN products ON products.id = products_fts.rowid '
+            'WHERE products_fts MATCH :match ORDER BY products_fts.rank LIMIT :limit'),
+            {'match': match, 'limit': limit}).fetchall()
+    pattern = '%{}%'.format(terms)
+    return db.session.query(Product.id, Product.name, Product.location, Product.stock) \
+        .filter(or_(Product.name.ilike(pattern), Product.location.ilike(pattern))) \
+        .limit(limit).all()
+
+
+def search_suppliers(terms, limit=50):
+    """
+    Find suppliers by name, email or address, best matches first
+    """
+    match = _match_query(terms)
+    if not match:
+        return []
+    if _use_fts():
+        return db.session.execute(text(
+            'SELECT suppliers.id, suppliers.name, suppliers.email, suppliers.address '
+            'FROM suppliers_fts JOIN suppliers ON suppliers.id = suppliers_fts.rowid '
+            'WHERE suppliers_fts MATCH :match ORDER BY suppliers_fts.rank LIMIT :limit'),
+            {'match': match, 'limit': limit}).fetchall()
+    pattern = '%{}%'.format(terms)
+    return db.session.query(Supplier.id, Supplier.name, Supplier.email, Supplier.address) \
+        .filter(or_(Supplier.name.ilike(pattern), Supplier.email.ilike(pattern),
+                    Supplier.address.ilike(pattern))) \
+        .limit(limit).all()
@@ -0,0 +1,291 @@
+# app/sessions.py
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from app import db, tenants
+from app.models import Employee, LoginSession
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session whose data lives on the server under a random id
+    """
+
+    def __init__(self, initial=None, sid=None, employee_id=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+        self.employee_id = employee_id
+        self.expires_at = expires_at
+        self.modified = False
+
+
+class LocalCache(object):
+    """
+    In-process LRU cache whose entries are trusted for a few seconds
+
+    Other workers may change the stored values, so nothing is served past
+    its age limit.
+    """
+
+    def __init__(self, size, seconds):
+        self.size = size
+        self.seconds = seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else None}
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DatabaseStore(object):
+    """
+    Keep sessions in the sessions table, shared by every worker
+    """
+
+    table = LoginSession.__table__
+
+    def load(self, sid):
+        row = db.engine.execute(self.table.select().where(self.table.c.id == sid)).first()
+        if row is None:
+            return None
+        return row.data, row.expires_at, row.employee_id
+
+    def save(self, sid, data, expires_at, employee_id):
+        values = {'data': data, 'expires_at': expires_at, 'employee_id': employee_id}
+        result = db.engine.execute(self.table.update().where(self.table.c.id == sid)
+                                   .values(**values))
+        if result.rowcount == 0:
+            db.engine.execute(self.table.insert().values(id=sid, **values))
+
+    def touch(self, sid, expires_at):
+        db.engine.execute(self.table.update().where(self.table.c.id == sid)
+                          .values(expires_at=expires_at))
+
+    def delete(self, sid):
+        db.engine.execute(self.table.delete().where(self.table.c.id == sid))
+
+    def revoke(self, employee_id):
+        sids = [row.id for row in db.engine.execute(
+            db.select([self.table.c.id]).where(self.table.c.employee_id == employee_id))]
+        db.engine.execute(self.table.delete().where(self.table.c.employee_id == employee_id))
+        return sids
+
+    def purge(self, now):
+        return db.engine.execute(self.table.delete().where(self.table.c.expires_at < now)).rowcount
+
+
+class MemoryStore(object):
+    """
+    Keep sessions in a dict of this process, for a single worker or tests
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        return self._sessions.get(sid)
+
+    def save(self, sid, data, expires_at, employee_id):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at, employee_id)
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            if sid in self._sessions:
+                data, _, employee_id = self._sessions[sid]
+                self._sessions[sid] = (data, expires_at, employee_id)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def revoke(self, employee_id):
+        with self._lock:
+            sids = [sid for sid, record in self._sessions.items() if record[2] == employee_id]
+            for sid in sids:
+                del self._sessions[sid]
+        return sids
+
+    def purge(self, now):
+        with self._lock:
+            sids = [sid for sid, record in self._sessions.items() if record[1] < now]
+            for sid in sids:
+                del self._sessions[sid]
+        return len(sids)
+
+
+STORES = {
+    'database': DatabaseStore,
+    'memory': MemoryStore,
+}
+
+
+def _key(*parts):
+    # the same ids exist in the database of every tenant
+    return (tenants.current(),) + parts
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Store sessions server-side behind a read-through local cache
+
+    The cookie only carries the session id. Sessions expire after
+    SESSION_IDLE_MINUTES unused, the expiry sliding forward at most every
+    SESSION_REFRESH_SECONDS so that most requests write nothing.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, cache):
+        self.store = store
+        self.cache = cache
+
+    def _load(self, sid):
+        record = self.cache.get(_key(sid))
+        if record is None:
+            record = self.store.load(sid)
+            if record is not None:
+                self.cache.set(_key(sid), record)
+        return record
+
+    def _save(self, sid, data, expires_at, employee_id):
+        self.store.save(sid, data, expires_at, employee_id)
+        self.cache.set(_key(sid), (data, expires_at, employee_id))
+
+    def _delete(self, sid):
+        self.store.delete(sid)
+        self.cache.discard(_key(sid))
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid:
+            record = self._load(sid)
+            if record is not None and record[1] > datetime.utcnow():
+                data, expires_at, employee_id = record
+                return ServerSession(self.serializer.loads(data), sid, employee_id, expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            # emptied, e.g. on logout
+            if session.sid is not None:
+                self._delete(session.sid)
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        idle = timedelta(minutes=app.config['SESSION_IDLE_MINUTES'])
+        user_id = session.get('_user_id')
+        employee_id = int(user_id) if user_id is not None else None
+        sid = session.sid
+        if sid is not None and employee_id != session.employee_id:
+            # a new id on login or logout, so an id seen before cannot be reused
+            self._delete(sid)
+            sid = None
+
+        if sid is None or session.modified:
+            sid = sid or secrets.token_urlsafe(32)
+            self._save(sid, self.serializer.dumps(dict(session)), now + idle, employee_id)
+        elif session.expires_at - now < idle - timedelta(seconds=app.config['SESSION_REFRESH_SECONDS']):
+            self.store.touch(sid, now + idle)
+            self.cache.discard(_key(sid))
+
+        if sid != session.sid:
+            response.set_cookie(app.session_cookie_name, sid,
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+
+def load_employee(employee_id):
+    """
+    Return the employee of a session, from the local cache when it can
+
+    A cached employee is a transient copy, good for reading only.
+    """
+    cache = current_app.session_interface.cache
+    key = _key('employee', employee_id)
+    columns = cache.get(key)
+    if columns is not None:
+        return Employee(**columns)
+    employee = Employee.query.get(employee_id)
+    if employee is not None:
+        cache.set(key, {column.name: getattr(employee, column.name)
+                        for column in Employee.__table__.columns})
+    return employee
+
+
+def revoke(employee_id):
+    """
+    End every session of an employee, returns how many there were
+
+    Other workers may keep serving a revoked session from their local
+    cache for up to SESSION_CACHE_SECONDS.
+    """
+    interface = current_app.session_interface
+    sids = interface.store.revoke(employee_id)
+    for sid in sids:
+        interface.cache.discard(_key(sid))
+    interface.cache.discard(_key('employee', employee_id))
+    return len(sids)
+
+
+def purge():
+    """
+    Delete the expired sessions, returns how many there were
+    """
+    return current_app.session_interface.store.purge(datetime.utcnow())
+
+
+def init_app(app):
+    backend = app.config['SESSION_BACKEND']
+    if backend is None:
+        return
+    cache = LocalCache(app.config['SESSION_CACHE_SIZE'], app.config['SESSION_CACHE_SECONDS'])
+    app.session_interface = ServerSessionInterface(STORES[backend](), cache)
@@ -0,0 +1,138 @@
+# app/slow_queries.py
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+
+# EXPLAIN statement of each backend, for the query plan of a slow query
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+# Statements the backends can EXPLAIN
+EXPLAINED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+# Longest parameter value logged, in characters
+PARAMETER_LENGTH = 200
+
+
+def _path(app):
+    return os.path.join(app.instance_path, app.config['SLOW_QUERY_LOG'])
+
+
+def _parameters(parameters):
+    if isinstance(parameters, dict):
+        return {key: _parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_parameters(value) for value in parameters]
+    if parameters is None or isinstance(parameters, (int, float)):
+        return parameters
+    return str(parameters)[:PARAMETER_LENGTH]
+
+
+def _explain(connection, statement, parameters):
+    """
+    Return the plan the backend picks for a statement, as lines of text
+
+    The EXPLAIN runs in the caller's transaction, on PostgreSQL inside a
+    savepoint so that a failed EXPLAIN does not abort that transaction.
+    """
+    prefix = EXPLAIN.get(connection.dialect.name)
+    words = statement.split(None, 1)
+    if prefix is None or not words or words[0].upper() not in EXPLAINED:
+        return None
+    savepoint = connection.dialect.name == 'postgresql'
+    # a raw cursor, so the EXPLAIN itself is not timed and logged
+    cursor = connection.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_plan')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+        except Exception as exception:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_plan')
+            return ['EXPLAIN failed: {}'.format(exception)]
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_plan')
+        return plan
+    finally:
+        cursor.close()
+
+
+def watch(app, engine):
+    """
+    Time the statements of an engine, for engines made after init_app
+    """
+    threshold = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000.0
+    handler = app.extensions['slow_queries']
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish(connection, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - connection.info['query_start'].pop()
+        if seconds < threshold:
+            return
+        entry = {
+            'time': datetime.utcnow().isoformat(),
+            'milliseconds': round(seconds * 1000, 1),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'statement': statement,
+            'parameters': _parameters(parameters),
+            'executemany': executemany,
+            'plan': None if executemany else _explain(connection, statement, parameters),
+        }
+        handler.handle(logging.makeLogRecord({'msg': json.dumps(entry, default=str)}))
+
+
+def init_app(app):
+    """
+    Log the statements slower than SLOW_QUERY_THRESHOLD_MS with their plan
+    """
+    if app.config['SLOW_QUERY_THRESHOLD_MS'] is None:
+        return
+    os.makedirs(app.instance_path, exist_ok=True)
+    handler = RotatingFileHandler(_path(app), maxBytes=app.config['SLOW_QUERY_LOG_BYTES'],
+                                  backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    app.extensions['slow_queries'] = handler
+
+    with app.app_context():
+        watch(app, db.engine)
+
+
+def recent(app, limit=200):
+    """
+    Return the latest logged slow queries, newest first
+    """
+    path = _path(app)
+    entries = []
+    for index in range(app.config['SLOW_QUERY_LOG_BACKUPS'] + 1):
+        name = path if index == 0 else '{}.{}'.format(path, index)
+        if not os.path.isfile(name):
+            break
+        with open(name) as log:
+            lines = log.readlines()
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(entries) >= limit:
+                return entries
+    return entries
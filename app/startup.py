@@ -0,0 +1,45 @@
+# app/startup.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Run in a fresh interpreter so nothing is imported or connected yet
+PROBE = '''
+import json, sys, time
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+connections = []
+event.listen(Pool, 'connect', lambda *args: connections.append(1))
+start = time.perf_counter()
+from app import create_app
+create_app(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'connections': len(connections),
+                  'modules': sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules)}))
+'''
+
+
+def measure(config_name, deferred_modules, runs=5):
+    """
+    Time create_app in fresh interpreters
+
+    Returns the median seconds of the runs, the deferred modules that were
+    imported anyway and the number of database connections opened.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', PROBE, config_name,
+                                 json.dumps(list(deferred_modules))],
+                                cwd=root, env=env, check=True, stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    modules = sorted(set(name for result in results for name in result['modules']))
+    connections = max(result['connections'] for result in results)
+    return statistics.median(result['seconds'] for result in results), modules, connections
@@ -0,0 +1,72 @@
+# app/stats.py
+
+import os
+import threading
+import time
+
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class InFlight(object):
+    """
+    WSGI middleware counting the requests being served by this process
+
+    A request counts until its response has been sent in full, streamed
+    ones included.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.count = 0
+        self.served = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _done(self):
+        with self._lock:
+            self.count -= 1
+            self.served += 1
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+        try:
+            response = self.wsgi_app(environ, start_response)
+        except Exception:
+            self._done()
+            raise
+        return ClosingIterator(response, self._done)
+
+
+def memory():
+    """
+    Return the resident and peak resident memory of this process in bytes
+    """
+    rss = None
+    try:
+        with open('/proc/self/statm') as statm:
+            rss = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    peak = None
+    if resource is not None:
+        # kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if os.uname().sysname == 'Darwin' else 1024
+    return {'rss': rss, 'peak_rss': peak}
+
+
+def pool(engine):
+    """
+    Return the checkout numbers of the connection pool of an engine
+    """
+    stats = {'class': type(engine.pool).__name__, 'status': engine.pool.status()}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(engine.pool, name):
+            stats[name] = getattr(engine.pool, name)()
+    return stats
@@ -0,0 +1,181 @@
+# app/sync.py
+
+from datetime import date
+from itertools import chain
+
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import and_, case, event, func, literal, or_, select
+
+from app import db
+from app.models import Change, Product, Shipment, Supplier, SyncCounter, Transaction
+
+
+changes = Change.__table__
+counter = SyncCounter.__table__
+
+# Tables handheld clients keep a copy of, by name
+SYNCED = {model.__tablename__: model for model in (Product, Supplier, Shipment, Transaction)}
+
+
+class ResyncRequired(Exception):
+    """
+    Raised for a cursor older than the purged tombstones, the client has
+    to drop its copy and start again from 0
+    """
+
+
+def _version(session):
+    """
+    Return the change version of the session's transaction
+
+    The counter is bumped on the first change of a transaction, its row
+    stays locked until the transaction ends so versions become visible in
+    the order they were handed out and a client never skips one.
+    """
+    version = session.info.get('sync_version')
+    if version is None:
+        session.execute(counter.update().values(version=counter.c.version + 1))
+        version = session.execute(select([counter.c.version])).scalar()
+        session.info['sync_version'] = version
+    return version
+
+
+def last_id(model):
+    """
+    Return the highest id of a synced table, to stamp the rows inserted
+    after it with touch
+    """
+    return db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+
+
+def touch(model, criterion=None, deleted=False):
+    """
+    Stamp the rows of a synced table matching criterion as changed, or as
+    deleted, for writes made with Core statements
+
+    Deletes have to be stamped before the rows are gone.
+    """
+    name = model.__tablename__
+    rows = select([model.id])
+    if criterion is not None:
+        rows = rows.where(criterion)
+    version = _version(db.session)
+    db.session.execute(changes.delete().where(changes.c.table_name == name)
+                       .where(changes.c.row_id.in_(rows)))
+    db.session.execute(changes.insert().from_select(
+        ['table_name', 'row_id', 'version', 'deleted'],
+        rows.with_only_columns([literal(name, db.String), model.id,
+                                literal(version, db.Integer), literal(deleted, db.Boolean)])))
+
+
+def _stamp(session, rows):
+    """
+    Stamp rows flushed by the ORM, rows are (table name, id, deleted)
+    """
+    version = _version(session)
+    for name in set(row[0] for row in rows):
+        session.execute(changes.delete().where(changes.c.table_name == name)
+                        .where(changes.c.row_id.in_([row[1] for row in rows if row[0] == name])))
+    session.execute(changes.insert(), [
+        {'table_name': name, 'row_id': row_id, 'version': version, 'deleted': deleted}
+        for name, row_id, deleted in rows])
+
+
+def purge(before):
+    """
+    Delete the tombstones of the versions below before
+
+    The rows still stamped below before are moved up to it, so that a
+    client starting from 0 is never handed a cursor below it, and clients
+    resuming from an older cursor are told to resync. Returns the number
+    of tombstones deleted, the caller commits.
+    """
+    # taking the counter row first waits for the writers in flight
+    db.session.execute(counter.update().values(
+        purged=case([(counter.c.purged < before, before)], else_=counter.c.purged)))
+    version, purged = db.session.execute(select([counter.c.version, counter.c.purged])).first()
+    if before > version:
+        raise ValueError('No version {} yet, the last is {}.'.format(before, version))
+    count = db.session.execute(changes.delete().where(changes.c.version < purged)
+                               .where(changes.c.deleted.is_(True))).rowcount
+    db.session.execute(changes.update().where(changes.c.version < purged).values(version=purged))
+    return count
+
+
+def parse_cursor(text):
+    """
+    Parse a cursor, a version alone or the last change read as
+    version:table:id
+    """
+    parts = (text or '0').split(':')
+    if len(parts) == 1:
+        return int(parts[0]), None, None
+    if len(parts) != 3 or parts[1] not in SYNCED:
+        raise ValueError('Invalid cursor.')
+    return int(parts[0]), parts[1], int(parts[2])
+
+
+def _row(model, row):
+    return {column.name: value.isoformat() if isinstance(value, date) else value
+            for column, value in zip(model.__table__.columns, row)}
+
+
+def changes_since(cursor, limit):
+    """
+    Return the rows changed after a cursor, at most limit of them
+
+    Changes are read in version order and a batch may end inside a
+    version, the cursor returned names the last change read. Rows deleted
+    are returned as ids only.
+    """
+    version, name, row_id = parse_cursor(cursor)
+    if (version or name is not None) and \
+            version < db.session.execute(select([counter.c.purged])).scalar():
+        raise ResyncRequired('Tombstones since version {} were purged.'.format(version))
+    after = changes.c.version > version
+    if name is not None:
+        after = or_(after, and_(changes.c.version == version,
+                                or_(changes.c.table_name > name,
+                                    and_(changes.c.table_name == name, changes.c.row_id > row_id))))
+    read = db.session.execute(
+        select([changes.c.version, changes.c.table_name, changes.c.row_id, changes.c.deleted])
+        .where(after)
+        .order_by(changes.c.version, changes.c.table_name, changes.c.row_id)
+        .limit(limit + 1)).fetchall()
+    more = len(read) > limit
+    read = read[:limit]
+
+    tables = {}
+    for name, model in SYNCED.items():
+        ids = [row.row_id for row in read if row.table_name == name and not row.deleted]
+        deleted = [row.row_id for row in read if row.table_name == name and row.deleted]
+        if not ids and not deleted:
+            continue
+        rows = [_row(model, row) for row in db.session.execute(
+            model.__table__.select().where(model.id.in_(ids)))] if ids else []
+        # rows deleted without being stamped are reported as deleted too
+        found = set(row['id'] for row in rows)
+        tables[name] = {'rows': rows, 'deleted': deleted + [id for id in ids if id not in found]}
+
+    if read:
+        cursor = '{}:{}:{}'.format(read[-1].version, read[-1].table_name, read[-1].row_id)
+    return {'cursor': cursor or '0', 'more': more, 'changes': tables}
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def _watch_flush(session, flush_context):
+    synced = tuple(SYNCED.values())
+    rows = [(instance.__tablename__, instance.id, False)
+            for instance in chain(session.new, (instance for instance in session.dirty
+                                                if session.is_modified(instance)))
+            if isinstance(instance, synced)]
+    rows.extend((instance.__tablename__, instance.id, True)
+                for instance in session.deleted if isinstance(instance, synced))
+    if rows:
+        _stamp(session, rows)
+
+
+@event.listens_for(SignallingSession, 'after_transaction_end')
+def _forget_version(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('sync_version', None)
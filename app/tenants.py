@@ -0,0 +1,232 @@
+# app/tenants.py
+
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, _EngineConnector
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import event
+
+
+class TenantSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy whose default engine is the one of the current tenant
+
+    Sessions are bound when first used in an app context, so the tenant is
+    settled before the first query of a request.
+    """
+
+    def get_engine(self, app=None, bind=None):
+        if bind is None and has_app_context() and current_app.config['TENANTS']:
+            name = current()
+            if name is not None:
+                return engine(name)
+        return super(TenantSQLAlchemy, self).get_engine(app, bind)
+
+
+class TenantConnector(_EngineConnector):
+    """
+    Engine of one tenant, made with the options of the default engine
+    """
+
+    def __init__(self, sa, app, name):
+        super(TenantConnector, self).__init__(sa, app)
+        self.name = name
+
+    def get_uri(self):
+        return self._app.config['TENANTS'][self.name]['uri']
+
+
+class Engines(object):
+    """
+    Engines of the tenants, created on first use and closed least recently
+    used first past TENANT_ENGINES
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.size = app.config['TENANT_ENGINES']
+        self._connectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, name):
+        with self._lock:
+            connector = self._connectors.get(name)
+            if connector is not None:
+                self._connectors.move_to_end(name)
+                return connector.get_engine()
+            connector = TenantConnector(self.app.extensions['sqlalchemy'].db, self.app, name)
+            engine = connector.get_engine()
+            _watch(self.app, name, engine)
+            self._connectors[name] = connector
+            self.created += 1
+            while len(self._connectors) > self.size:
+                # requests still holding a connection finish on it
+                self._connectors.popitem(last=False)[1].get_engine().dispose()
+                self.evicted += 1
+            return engine
+
+    def stats(self):
+        with self._lock:
+            return {'open': list(self._connectors), 'created': self.created,
+                    'evicted': self.evicted}
+
+
+def _watch(app, name, engine):
+    """
+    Hook a new tenant engine into its schema and the slow-query log
+    """
+    schema = app.config['TENANTS'][name].get('schema')
+    if schema is not None and engine.dialect.name == 'postgresql':
+        @event.listens_for(engine, 'connect')
+        def set_search_path(connection, record):
+            cursor = connection.cursor()
+            cursor.execute('SET search_path TO "{}"'.format(schema))
+            cursor.close()
+    if 'slow_queries' in app.extensions:
+        from app import slow_queries
+        slow_queries.watch(app, engine)
+
+
+def engine(name):
+    """
+    Return the engine of a tenant
+    """
+    return current_app.extensions['tenants'].get(name)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='tenant')
+
+
+def _from_request():
+    """
+    Return the tenant named by the subdomain or else the one remembered
+    from the last login, or None
+    """
+    tenants = current_app.config['TENANTS']
+    subdomain = request.host.split(':')[0].split('.')[0]
+    if subdomain in tenants:
+        g.tenant_source = 'subdomain'
+        return subdomain
+    cookie = request.cookies.get(current_app.config['TENANT_COOKIE'])
+    if cookie:
+        try:
+            name = _serializer().loads(cookie)
+        except BadSignature:
+            return None
+        if name in tenants:
+            g.tenant_source = 'cookie'
+            return name
+    return None
+
+
+def current():
+    """
+    Return the name of the current tenant, None for the default database
+    """
+    if 'tenant' not in g:
+        g.tenant = _from_request() if has_request_context() else None
+    return g.tenant
+
+
+def switch(name):
+    """
+    Make a tenant current for the rest of the app context
+    """
+    if current() != name:
+        current_app.extensions['sqlalchemy'].db.session.remove()
+        g.tenant = name
+
+
+@contextmanager
+def use(name):
+    """
+    Run a block on the database of a tenant, e.g. from a command
+    """
+    previous = current()
+    switch(name)
+    try:
+        yield
+    finally:
+        switch(previous)
+
+
+def login(email):
+    """
+    Route a login without a tenant subdomain by the domain of the email
+
+    Returns the tenant routed to, or None, for remember once the password
+    is checked.
+    """
+    if g.get('tenant_source') == 'subdomain':
+        return None
+    domain = email.rsplit('@', 1)[-1].lower()
+    for name, tenant in current_app.config['TENANTS'].items():
+        if domain in tenant.get('email_domains', ()):
+            switch(name)
+            return name
+    return None
+
+
+def remember(name):
+    """
+    Remember the tenant of a successful login in a signed cookie, so the
+    next requests go to it
+    """
+    if name is not None:
+        g.tenant_login = name
+
+
+def owns_session():
+    """
+    Tell whether the session was logged into on the current tenant, as
+    employee ids repeat across tenants
+    """
+    return session.get('tenant') == current()
+
+
+def _remember(response):
+    name = g.get('tenant_login')
+    if name is not None:
+        response.set_cookie(current_app.config['TENANT_COOKIE'], _serializer().dumps(name),
+                            httponly=True, secure=current_app.config['SESSION_COOKIE_SECURE'],
+                            samesite=current_app.config['SESSION_COOKIE_SAMESITE'])
+    return response
+
+
+def upgrade(app, revision='head', workers=None):
+    """
+    Migrate the database of every tenant, several at once
+
+    Each tenant is migrated by its own `flask db upgrade` process as
+    Alembic keeps its state in module globals. Returns the tenants with
+    the exit code and output of their migration.
+    """
+    directory = app.extensions['migrate'].directory
+
+    def run(name):
+        process = subprocess.run(
+            [sys.executable, '-m', 'flask', 'db', 'upgrade', revision,
+             '--directory', directory, '-x', 'tenant=' + name],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        return name, process.returncode, process.stdout
+
+    names = sorted(app.config['TENANTS'])
+    with ThreadPoolExecutor(workers or app.config['TENANT_MIGRATION_WORKERS']) as executor:
+        return list(executor.map(run, names))
+
+
+def init_app(app):
+    # a single database unless tenants are configured
+    if not app.config['TENANTS']:
+        return
+    app.extensions['tenants'] = Engines(app)
+    app.after_request(_remember)
@@ -0,0 +1,157 @@
+# app/timeseries.py
+
+import threading
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db, ledger, tenants
+from app.models import Product, Transaction
+from app.sessions import LocalCache
+
+
+# Ways of reducing a series to its buckets, the first is the default
+METHODS = ('minmax', 'lttb')
+
+_lock = threading.Lock()
+
+
+def _cache():
+    cache = current_app.extensions.get('timeseries')
+    if cache is None:
+        with _lock:
+            cache = current_app.extensions.setdefault('timeseries', LocalCache(
+                current_app.config['TIMESERIES_CACHE_SIZE'],
+                current_app.config['TIMESERIES_CACHE_SECONDS']))
+    return cache
+
+
+def _products(product_id=None, location_id=None):
+    """
+    Select the ids of the products a series sums
+    """
+    if product_id is not None:
+        return select([Product.id]).where(Product.id == product_id)
+    return select([Product.id]).where(Product.location_id == location_id)
+
+
+def running_stock(products, start, end):
+    """
+    Return the stock before start and after each transaction up to end
+
+    The stock before start comes from the snapshots, the rest is a
+    cumulative sum of the transactions. Returns the opening stock, the
+    day ordinals and the stock levels as NumPy arrays, in ledger order.
+    Raises ValueError when start is in the archived months.
+    """
+    import numpy as np
+
+    stock = ledger.stock_as_of(start - timedelta(days=1))
+    opening = db.session.query(func.coalesce(func.sum(stock.c.stock), 0)) \
+        .filter(stock.c.product_id.in_(products)).scalar()
+    rows = db.session.execute(
+        select([Transaction.date, Transaction.quantity])
+        .where(Transaction.product_id.in_(products))
+        .where(Transaction.date >= start)
+        .where(Transaction.date <= end)
+        .order_by(Transaction.date, Transaction.id)).fetchall()
+    days = np.fromiter((row[0].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    quantities = np.fromiter((row[1] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    opening = float(opening)
+    return opening, days, opening + np.cumsum(quantities)
+
+
+def minmax(days, levels, start, end, buckets):
+    """
+    Reduce a series to the lowest, highest and last level of each bucket
+
+    Buckets split the days from start to end evenly, those without a
+    transaction are left out as the stock did not move in them.
+    """
+    import numpy as np
+
+    if not len(days):
+        return []
+    span = end.toordinal() - start.toordinal() + 1
+    index = (days - start.toordinal()) * buckets // span
+    # first position of each bucket holding a transaction
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    lows = np.minimum.reduceat(levels, starts)
+    highs = np.maximum.reduceat(levels, starts)
+    lasts = levels[np.r_[starts[1:] - 1, len(levels) - 1]]
+    return [{'date': date.fromordinal(start.toordinal() + int(index[position]) * span // buckets).isoformat(),
+             'min': float(low), 'max': float(high), 'last': float(last)}
+            for position, low, high, last in zip(starts, lows, highs, lasts)]
+
+
+def lttb(days, levels, buckets):
+    """
+    Pick the points that keep the shape of a series, by largest triangle
+    three buckets
+    """
+    import numpy as np
+
+    count = len(days)
+    if count <= buckets:
+        picked = np.arange(count)
+    elif buckets < 3:
+        # too few buckets for triangles, keep the last point and the first
+        picked = [0, count - 1][-buckets:]
+    else:
+        x = days.astype(np.float64)
+        edges = np.linspace(1, count - 1, buckets - 1).astype(np.int64)
+        picked = [0]
+        for bucket in range(buckets - 2):
+            low, high = edges[bucket], edges[bucket + 1]
+            # the next bucket's average, or the last point for the last one
+            following = slice(high, edges[bucket + 2]) if bucket + 2 < len(edges) else slice(count - 1, count)
+            average_x, average_y = x[following].mean(), levels[following].mean()
+            previous = picked[-1]
+            areas = np.abs((x[previous] - average_x) * (levels[low:high] - levels[previous])
+                           - (x[previous] - x[low:high]) * (average_y - levels[previous]))
+            picked.append(low + int(areas.argmax()))
+        picked.append(count - 1)
+    return [{'date': date.fromordinal(int(days[position])).isoformat(), 'stock': float(levels[position])}
+            for position in picked]
+
+
+def stock_series(product_id=None, location_id=None, start=None, end=None, buckets=None, method=None):
+    """
+    Return the stock of a product, or of the products at a location,
+    downsampled to at most a number of buckets
+
+    Results are cached per tenant and arguments for
+    TIMESERIES_CACHE_SECONDS.
+    """
+    config = current_app.config
+    end = end or date.today()
+    if start is None:
+        # the default window stops at the archive rather than failing
+        start = end - timedelta(days=config['TIMESERIES_DEFAULT_DAYS'])
+        opened = ledger.opening_date()
+        if opened is not None:
+            start = max(start, opened + timedelta(days=1))
+    buckets = min(buckets or config['TIMESERIES_DEFAULT_BUCKETS'], config['TIMESERIES_MAX_BUCKETS'])
+    method = method or METHODS[0]
+
+    key = (tenants.current(), product_id, location_id, start, end, buckets, method)
+    cache = _cache()
+    series = cache.get(key)
+    if series is not None:
+        return series
+
+    opening, days, levels = running_stock(_products(product_id, location_id), start, end)
+    series = {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'method': method,
+        'buckets': buckets,
+        'transactions': len(days),
+        'opening': opening,
+        'closing': float(levels[-1]) if len(levels) else opening,
+        'series': minmax(days, levels, start, end, buckets) if method == 'minmax'
+        else lttb(days, levels, buckets),
+    }
+    cache.set(key, series)
+    return series
@@ -8,6 +8,128 @@ class Config(object):
 
     # Put any configurations here that are common across all environments
 
+    # Demand forecasting: days of history used, days forecast, moving
+    # average window and exponential smoothing factor
+    FORECAST_HISTORY_DAYS = 182
+    FORECAST_HORIZON_DAYS = 28
+    FORECAST_WINDOW_DAYS = 28
+    FORECAST_ALPHA = 0.3
+
+    # Reorder points: days of demand history, lead time of suppliers
+    # without one, service factor (z score) and days of demand to order
+    REORDER_HISTORY_DAYS = 91
+    REORDER_LEAD_TIME_DAYS = 7
+    REORDER_SERVICE_FACTOR = 1.65
+    REORDER_COVER_DAYS = 28
+
+    # ABC/XYZ classification: days of demand looked at, cumulative volume
+    # shares closing the A and B classes and coefficients of variation
+    # closing the X and Y classes
+    CLASSIFICATION_WINDOW_DAYS = 364
+    CLASSIFICATION_ABC_SHARES = (0.8, 0.95)
+    CLASSIFICATION_XYZ_VARIATIONS = (0.5, 1.0)
+
+    # Transaction archive: directory of the monthly partitions, relative to
+    # the instance folder, and number of months kept in the database
+    ARCHIVE_DIR = 'archive'
+    ARCHIVE_KEEP_MONTHS = 24
+
+    # Cold start: seconds create_app may take in a fresh interpreter and
+    # modules that must only be imported when a request needs them
+    STARTUP_BUDGET_SECONDS = 1.0
+    STARTUP_DEFERRED_MODULES = ('pandas', 'numpy')
+
+    # Password hashing: Werkzeug method with its iteration count and salt
+    # length, older hashes are upgraded at login. Hashes running at once,
+    # logins allowed to wait for one and seconds they wait
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:150000'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = 4
+    PASSWORD_HASH_QUEUE = 64
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Sessions: None keeps them in the signed cookie, 'database' or 'memory'
+    # stores them server-side. Minutes a session lives unused, seconds
+    # between refreshes of its expiry, and entries and seconds kept in the
+    # local cache of each worker
+    SESSION_BACKEND = None
+    SESSION_IDLE_MINUTES = 480
+    SESSION_REFRESH_SECONDS = 300
+    SESSION_CACHE_SIZE = 10000
+    SESSION_CACHE_SECONDS = 30
+
+    # Locations: warehouse of locations typed without one
+    LOCATION_DEFAULT_WAREHOUSE = 'Main'
+
+    # Scan ingestion: milliseconds a batch waits for more events after its
+    # first, events per batch and seconds a caller waits for its commit
+    SCAN_MAX_DELAY_MS = 20
+    SCAN_BATCH_SIZE = 200
+    SCAN_ACK_TIMEOUT = 10
+
+    # Request profiling: nothing is hooked in unless enabled. Admins pick a
+    # profiler with the header or query parameter, the sample rate profiles
+    # that share of all requests. Profiles are written to a directory of
+    # the instance folder, the newest ones kept
+    PROFILE_ENABLED = False
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_PARAM = '_profile'
+    PROFILE_SAMPLE_RATE = 0.0
+    PROFILE_SAMPLE_MODE = 'sampling'
+    PROFILE_INTERVAL_MS = 5
+    PROFILE_DIR = 'profiles'
+    PROFILE_KEEP = 100
+
+    # Slow-query log: milliseconds from which a statement is logged with its
+    # plan, None to switch it off, and the rotating log in the instance
+    # folder, its size in bytes and the rotated files kept
+    SLOW_QUERY_THRESHOLD_MS = 250
+    SLOW_QUERY_LOG = 'slow-queries.log'
+    SLOW_QUERY_LOG_BYTES = 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+
+    # Dashboard: KPIs are precomputed into a small table, refreshed in the
+    # background after writes at most every DASHBOARD_REFRESH_SECONDS and
+    # when read older than DASHBOARD_MAX_AGE_SECONDS. Expiry windows in
+    # days, days of movements ranking the top movers and entries per list
+    DASHBOARD_REFRESH_SECONDS = 5
+    DASHBOARD_MAX_AGE_SECONDS = 300
+    DASHBOARD_EXPIRY_DAYS = (7, 30)
+    DASHBOARD_MOVER_DAYS = 7
+    DASHBOARD_TOP = 10
+
+    # Stock time series: days charted by default, buckets a series is
+    # reduced to by default and at most, and entries and seconds its
+    # results are cached in each worker
+    TIMESERIES_DEFAULT_DAYS = 365
+    TIMESERIES_DEFAULT_BUCKETS = 500
+    TIMESERIES_MAX_BUCKETS = 5000
+    TIMESERIES_CACHE_SIZE = 256
+    TIMESERIES_CACHE_SECONDS = 60
+
+    # Delta sync: changes returned by /sync per batch by default and at most
+    SYNC_DEFAULT_BATCH = 500
+    SYNC_MAX_BATCH = 5000
+
+    # Tenants: plants served by this deployment, by name, each with its
+    # database 'uri' and optionally a PostgreSQL 'schema' and the
+    # 'email_domains' of its employees. A request goes to the plant named by
+    # its subdomain or else to the one its employee logged into. Empty
+    # serves SQLALCHEMY_DATABASE_URI alone. Engines kept open at once, the
+    # least recently used closed first, cookie remembering the plant and
+    # tenants migrated at once
+    TENANTS = {}
+    TENANT_ENGINES = 16
+    TENANT_COOKIE = 'tenant'
+    TENANT_MIGRATION_WORKERS = 4
+
+    # Health checks: seconds the readiness probe waits for the database and
+    # addresses that may read /internal/stats without logging in, empty for
+    # admins only. Addresses are request.remote_addr, behind a reverse proxy
+    # that is the proxy's own unless ProxyFix sets the client's
+    READY_TIMEOUT_SECONDS = 1.0
+    STATS_ALLOWED_ADDRESSES = ()
+
 
 class DevelopmentConfig(Config):
     """
@@ -2,4 +2,5 @@
 
 export FLASK_CONFIG=production
 export FLASK_APP=run.py
+flask assets build
 flask run
@@ -1,3 +1,4 @@
 SET FLASK_CONFIG=production
 SET FLASK_APP=run.py
+flask assets build
 flask run
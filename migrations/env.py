@@ -18,8 +18,15 @@ logger = logging.getLogger('alembic.env')
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from flask import current_app
-config.set_main_option('sqlalchemy.url',
-                       current_app.config.get('SQLALCHEMY_DATABASE_URI'))
+from app import tenants
+# `flask tenants upgrade` migrates each tenant with -x tenant=<name>
+tenant = context.get_x_argument(as_dictionary=True).get('tenant')
+if tenant is None:
+    config.set_main_option('sqlalchemy.url',
+                           current_app.config.get('SQLALCHEMY_DATABASE_URI'))
+else:
+    config.set_main_option('sqlalchemy.url',
+                           current_app.config['TENANTS'][tenant]['uri'])
 target_metadata = current_app.extensions['migrate'].db.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -65,14 +72,24 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
-    engine = engine_from_config(config.get_section(config.config_ini_section),
-                                prefix='sqlalchemy.',
-                                poolclass=pool.NullPool)
+    # full-text search tables are created by hand in their migration and
+    # must not be dropped by autogenerate
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == 'table' and '_fts' in name)
+
+    if tenant is None:
+        engine = engine_from_config(config.get_section(config.config_ini_section),
+                                    prefix='sqlalchemy.',
+                                    poolclass=pool.NullPool)
+    else:
+        # the tenant's own engine, with its schema
+        engine = tenants.engine(tenant)
 
     connection = engine.connect()
     context.configure(connection=connection,
                       target_metadata=target_metadata,
                       process_revision_directives=process_revision_directives,
+                      include_object=include_object,
                       **current_app.extensions['migrate'].configure_args)
     
     try:
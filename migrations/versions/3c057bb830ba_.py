@@ -0,0 +1,42 @@
+"""stock ledger and snapshots
+
+Revision ID: 3c057bb830ba
+Revises: 394ea8179a1b
+Create Date: 2019-02-04 10:12:31.530271
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c057bb830ba'
+down_revision = '394ea8179a1b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('stock', sa.Float(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('product_id', 'date')
+    )
+    op.add_column('transactions', sa.Column('reason', sa.String(length=20), nullable=True))
+    op.create_index(op.f('ix_transactions_date'), 'transactions', ['date'], unique=False)
+    op.create_index('ix_transactions_product_id_date', 'transactions', ['product_id', 'date'], unique=False)
+    # existing rows were only ever written for receipts and shipments
+    op.execute("UPDATE transactions SET reason = 'receipt' WHERE quantity > 0")
+    op.execute("UPDATE transactions SET reason = 'shipment' WHERE quantity <= 0")
+
+
+def downgrade():
+    op.drop_index('ix_transactions_product_id_date', table_name='transactions')
+    op.drop_index(op.f('ix_transactions_date'), table_name='transactions')
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_column('reason')
+    op.drop_table('stock_snapshots')
@@ -0,0 +1,55 @@
+"""full-text search over products and suppliers
+
+Revision ID: b64ac5c54c62
+Revises: 7775183f12f2
+Create Date: 2019-02-18 14:36:20.957143
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b64ac5c54c62'
+down_revision = '7775183f12f2'
+branch_labels = None
+depends_on = None
+
+
+# indexed table -> indexed columns
+INDEXES = {
+    'products': ['name', 'location'],
+    'suppliers': ['name', 'email', 'address'],
+}
+
+
+def upgrade():
+    # FTS5 is SQLite only, other backends are searched with LIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, columns in INDEXES.items():
+        names = ', '.join(columns)
+        new = ', '.join('new.' + column for column in columns)
+        old = ', '.join('old.' + column for column in columns)
+        op.execute("CREATE VIRTUAL TABLE {0}_fts USING fts5({1}, content='{0}', content_rowid='id')"
+                   .format(table, names))
+        op.execute("CREATE TRIGGER {0}_fts_insert AFTER INSERT ON {0} BEGIN "
+                   "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, {2}); END"
+                   .format(table, names, new))
+        op.execute("CREATE TRIGGER {0}_fts_delete AFTER DELETE ON {0} BEGIN "
+                   "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, {2}); END"
+                   .format(table, names, old))
+        # only edits of indexed columns touch the index, not stock updates
+        op.execute("CREATE TRIGGER {0}_fts_update AFTER UPDATE OF {1} ON {0} BEGIN "
+                   "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, {2}); "
+                   "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, {3}); END"
+                   .format(table, names, old, new))
+        op.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in INDEXES:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute('DROP TRIGGER IF EXISTS {}_fts_{}'.format(table, trigger))
+        op.execute('DROP TABLE IF EXISTS {}_fts'.format(table))